@@ -4,7 +4,6 @@ import datetime
 import json
 from itertools import groupby
 from collections import OrderedDict
-from statistics import stdev, median, mean
 import numpy as np
 
 from flask import Flask
@@ -17,13 +16,16 @@ from flask_jwt_extended import create_access_token, jwt_required, JWTManager
 # disable auth by uncommenting the following line
 # jwt_required = lambda: (lambda x: x) # disable auth
 
-from sqlalchemy import select, func, and_, or_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, func, and_, or_, cast, extract, literal_column, BigInteger
+from sqlalchemy.orm import joinedload, aliased
 
 from . import auth
+from .cache import cached_response
+from .filter_options import get_filter_options
 from model import model
 from .race import result_time_best_of_year_interval, compute_intermediates_figures, strokes_for_intermediate_steps
 from common.rowing import propulsion_in_meters_per_stroke
+from common.helpers import normalize_name
 from . import mocks  # todo: remove me
 from . import globals
 
@@ -44,6 +46,10 @@ jwt = JWTManager(app)
 # used similar to a context manager. using the constructor creates a scoped session, bound to its creating function scope 
 Scoped_Session = model.Scoped_Session
 
+# pagination of /get_athlete_by_name
+ATHLETE_SEARCH_PAGE_SIZE = 50
+ATHLETE_SEARCH_MAX_PAGE_SIZE = 200
+
 
 # Receive JSON via POST in flask: https://sentry.io/answers/flask-getting-post-data/#json-data
 # Parameterized route etc.: https://pythonbasics.org/flask-tutorial-routes/
@@ -87,25 +93,18 @@ def healthcheck():
 
 @app.route('/race_analysis_filter_options/', methods=['GET', 'POST'])
 @jwt_required()
+@cached_response
 def get_race_analysis_filter_options():
     """
     This endpoint give the filter options data for the race data page.
     """
-    session = Scoped_Session()
-    min_year, max_year = session.query(func.min(model.Competition.year), func.max(model.Competition.year)).first()
-
-    statement = select(model.Competition_Type.additional_id_, model.Competition_Type.abbreviation)
-    competition_categories = [{
-        "id": v[0],
-        "display_name": v[1],
-    } for v in session.execute(statement).fetchall()]
-    sorted_categories = sorted(competition_categories, key=lambda x: x['display_name'])
-
-    return {"years": (min_year, max_year), "competition_categories": sorted_categories}
+    options = get_filter_options(Scoped_Session())
+    return {"years": options['years'], "competition_categories": options['competition_types']}
 
 
 @app.route('/race_analysis_filter_results', methods=['POST'])
 @jwt_required()
+@cached_response
 def get_race_analysis_filter_results() -> dict:
     """
     WHEN?
@@ -201,18 +200,20 @@ def get_race_analysis_filter_results() -> dict:
 
 @app.route('/matrix', methods=['POST'])
 @jwt_required()
+@cached_response
 def get_matrix() -> dict:
     """
     COMMENT KAY WINKERT: Events begrenzen auf JWCh, WCh, Ech, WCp1, WCp2, WCp3, OG
     """
+    Statistics = model.Boat_Class_Statistics
     filter_key_mapping = {
-        'gender': model.Event.gender_id,  # list
-        'boat_class': model.Boat_Class.id,  # list
-        'interval': model.Competition.year,  # tuple
+        'gender': Statistics.gender_id,  # list
+        'boat_class': Statistics.boat_class_id,  # list
+        'interval': Statistics.year,  # tuple
         'competition_type': model.Competition_Type.additional_id_,  # list
-        'race_phase_type': model.Race.phase_type,  # list
-        'race_phase_subtype': model.Race.phase_number,  # list
-        'placement': model.Race_Boat.rank  # list
+        'race_phase_type': Statistics.phase_type,  # list
+        'race_phase_subtype': Statistics.phase_number,  # list
+        'placement': Statistics.rank  # list
     }
 
     # remove None's from the filters
@@ -221,26 +222,17 @@ def get_matrix() -> dict:
     # example filter args 
     # filters = {'gender': [1]}
 
+    # sums up the pre-aggregated valid 2000m result times (refreshed by the scraper's postprocessing)
     session = Scoped_Session()
     avg_times_statement = (
         select(
-            func.avg(model.Intermediate_Time.result_time_ms).label("mean"),
-            func.min(model.Intermediate_Time.result_time_ms).label("min"),
-            func.count(model.Intermediate_Time.race_boat_id).label("cnt"),
+            (func.sum(Statistics.result_time_sum_ms) / func.sum(Statistics.result_time_count)).label("mean"),
+            func.min(Statistics.result_time_min_ms).label("min"),
+            cast(func.sum(Statistics.result_count), BigInteger).label("cnt"),
             model.Boat_Class.additional_id_.label('id')
         )
-        .join(model.Intermediate_Time.race_boat)
-        .join(model.Race_Boat.race)
-        .join(model.Race.event)
-        .join(model.Event.boat_class)
-        .join(model.Event.competition)
-        .join(model.Competition.competition_type)
-        .join(model.Competition_Type.competition_category)
-        .where(
-            model.Intermediate_Time.distance_meter == 2000,
-            model.Intermediate_Time.is_outlier == False, 
-            model.Intermediate_Time.result_time_ms != 0
-        )
+        .join(Statistics.boat_class)
+        .join(Statistics.competition_type)
         .group_by(
             model.Boat_Class.id
         )
@@ -261,17 +253,16 @@ def get_matrix() -> dict:
     )
 
     avg_times = session.execute(avg_times_statement).fetchall()
-    wbts = session.execute(wbt_statement).fetchall()
+    wbts = dict(session.execute(wbt_statement).fetchall())
 
     result = {}
 
     for time in avg_times:
-        wbt = [wbt for wbt in wbts if wbt[0] == time.id]
-        if len(wbt) < 1:
+        if time.id not in wbts:
             wbt = time.min
             used_wbt = True
         else:
-            wbt = wbt[0][1]
+            wbt = wbts[time.id]
             used_wbt = False
 
         result[time.id] = {
@@ -286,6 +277,7 @@ def get_matrix() -> dict:
 
 @app.route('/get_race/<int:race_id>/', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_race(race_id: int) -> dict:
     """
     WHEN? THIS FUNCTION IS CALLED WHEN THE USER SELECTED A RACE 
@@ -423,71 +415,94 @@ def get_race(race_id: int) -> dict:
 
 @app.route('/get_report_boat_class', methods=['POST'])
 @jwt_required()
+@cached_response
 def get_report_boat_class():
     """
     Delivers the report results for a single boat class.
     """
     filter_data = request.json["data"]
     filter_keys = ["interval", "competition_type", "boat_class", "race_phase_type",
-                   "race_phase_subtype" "placement"]
-    interval, competition_types, boat_class, runs, ranks = [filter_data.get(key) for key in filter_keys]
+                   "race_phase_subtype", "placement"]
+    interval, competition_types, boat_class, runs, run_numbers, ranks = [filter_data.get(key) for key in filter_keys]
     start_year, end_year = interval[0], interval[1]
     start_date = datetime.datetime(start_year, 1, 1, 0, 0, 0)
     end_date = datetime.datetime(end_year, 12, 31, 23, 59, 59)
 
     session = Scoped_Session()
 
+    # One row per race; or per race boat of the race matching the result filters, along with its 500m/1000m intermediates.
+    World_Best_Race_Boat = aliased(model.Race_Boat)
+    Intermediate_500 = aliased(model.Intermediate_Time)
+    Intermediate_1000 = aliased(model.Intermediate_Time)
+
+    race_boat_conditions = [
+        model.Race_Boat.race_id == model.Race.id,
+        model.Race_Boat.result_time_ms != None,
+        model.Race_Boat.result_time_ms != 0,
+        model.Race.phase_type.in_(runs)
+    ]
+    if run_numbers:
+        race_boat_conditions.append(model.Race.phase_number.in_(run_numbers))
+    if ranks:
+        race_boat_conditions.append(model.Race_Boat.rank.in_(ranks))
+
+    def _intermediate_join(Intermediate, distance_meter):
+        return and_(
+            Intermediate.race_boat_id == model.Race_Boat.id,
+            Intermediate.distance_meter == distance_meter,
+            Intermediate.is_outlier == False
+        )
+
     statement = (
         select(
-            model.Race.id.label("race_id")
+            model.Competition_Category.name.label("competition_category"),
+            model.Boat_Class.abbreviation.label("boat_class"),
+            World_Best_Race_Boat.result_time_ms.label("world_best_time"),
+            model.Race.date,
+            model.Race_Boat.result_time_ms,
+            Intermediate_500.result_time_ms.label("result_time_500"),
+            Intermediate_1000.result_time_ms.label("result_time_1000")
         )
         .join(model.Race.event)
+        .join(model.Event.boat_class)
         .join(model.Event.competition)
         .join(model.Competition.competition_type)
         .join(model.Competition_Type.competition_category)
+        .outerjoin(World_Best_Race_Boat, model.Boat_Class.world_best_race_boat)
+        .outerjoin(model.Race_Boat, and_(*race_boat_conditions))
+        .outerjoin(Intermediate_500, _intermediate_join(Intermediate_500, 500))
+        .outerjoin(Intermediate_1000, _intermediate_join(Intermediate_1000, 1000))
         .where(and_(
             model.Race.date >= start_date,
             model.Race.date <= end_date,
-            model.Event.boat_class_id == model.Boat_Class.id,
             model.Boat_Class.additional_id_ == boat_class,
             model.Competition_Type.additional_id_.in_(competition_types)
         ))
+        .order_by(model.Race.date, model.Race_Boat.id)
     )
 
-    result = session.execute(statement).fetchall()
+    rows = session.execute(statement).fetchall()
     boat_class_name, wb_time, lowest_time_period = "", 0, 0
     race_times, race_dates, int_times_500, int_times_1000 = [], [], [], []
     comp_categories = set()
 
-    for row in result:
-        race_id = row
-        race = session.query(model.Race).get(race_id)
-        boat_class_name = race.event.boat_class.abbreviation
-        comp_categories.add(race.event.competition.competition_type.competition_category.name)
-
-        world_best_race_boat = race.event.boat_class.world_best_race_boat
-        if world_best_race_boat:
-            wb_time = world_best_race_boat.result_time_ms
-
-        for race_boat in race.race_boats:
-            if race_boat.result_time_ms and race.date and race.phase_type in runs \
-                    and (race_boat.rank in ranks if ranks else True):
-                race_times.append(race_boat.result_time_ms)
-                date = race.date
-                race_dates.append(
-                    '{:02d}'.format(date.year) + '-{:02d}'.format(date.month) + '-{:02d}'.format(date.day))
-                intermediate_times_for_race_boat = session.query(model.Intermediate_Time).filter(
-                    model.Intermediate_Time.race_boat_id == race_boat.id, 
-                    model.Intermediate_Time.is_outlier == False
-                ).all()
-                for intermediate_time in intermediate_times_for_race_boat:
-                    if intermediate_time.distance_meter == 500:
-                        int_times_500.append(intermediate_time.result_time_ms)
-                    elif intermediate_time.distance_meter == 1000:
-                        int_times_1000.append(intermediate_time.result_time_ms)
-
-    avg_500_time = int(mean(int_times_500)) if int_times_500 else 0
-    avg_1000_time = int(mean(int_times_1000)) if int_times_1000 else 0
+    for row in rows:
+        boat_class_name = row.boat_class
+        comp_categories.add(row.competition_category)
+        if row.world_best_time != None:
+            wb_time = row.world_best_time
+
+        if row.result_time_ms == None:
+            continue
+        race_times.append(row.result_time_ms)
+        race_dates.append(row.date.strftime('%Y-%m-%d'))
+        if row.result_time_500 != None:
+            int_times_500.append(row.result_time_500)
+        if row.result_time_1000 != None:
+            int_times_1000.append(row.result_time_1000)
+
+    avg_500_time = int(np.mean(int_times_500)) if int_times_500 else 0
+    avg_1000_time = int(np.mean(int_times_1000)) if int_times_1000 else 0
 
     results, mean_speed, mean_time, stdev_race_time, median_race_time = 0, 0, 0, 0, 0
     hist_data, hist_labels = [], []
@@ -499,16 +514,17 @@ def get_report_boat_class():
     hist_mean, hist_sd_low, hist_sd_high = 0, 0, 0
 
     if race_times:
+        times = np.array(race_times, dtype=np.int64)
         results = len(race_times)
-        lowest_time_period = min(race_times)
+        lowest_time_period = int(times.min())
         # TODO: Set race length dynamically
         race_distance = 2000
-        mean_speed = round(mean([race_distance / (time / 1000) for time in race_times]), 2)
-        mean_time = int(mean(race_times))
-        stdev_race_time = int(stdev(race_times))
-        median_race_time = int(median(race_times))
+        mean_speed = round(float(np.mean(race_distance / (times / 1000))), 2)
+        mean_time = int(np.mean(times))
+        stdev_race_time = int(np.std(times, ddof=1)) if results > 1 else 0
+        median_race_time = int(np.median(times))
 
-        hist_data, bin_edges = np.histogram(race_times, bins="fd")
+        hist_data, bin_edges = np.histogram(times, bins="fd")
         hist_data = hist_data.tolist() if len(hist_data) > 0 else []
         hist_labels = [int(bin_edge) for bin_edge in bin_edges]
         hist_mean = np.average(bin_edges[:-1], weights=hist_data)
@@ -517,22 +533,15 @@ def get_report_boat_class():
         hist_sd_low = hist_mean - hist_std
         hist_sd_high = hist_mean + hist_std
 
-        fastest_times = [x for x in race_times if x < (mean_time - stdev_race_time)]
-        medium_times = [x for x in race_times if
-                        (mean_time - stdev_race_time) < x < (mean_time - (1 / 3 * stdev_race_time))]
-        slow_times = [x for x in race_times if
-                      (mean_time - (1 / 3 * stdev_race_time)) < x < (mean_time + (1 / 3 * stdev_race_time))]
-        slowest_times = [x for x in race_times if x > (mean_time + (1 / 3 * stdev_race_time))]
-
-        fastest_times_n = len(fastest_times)
-        medium_times_n = len(medium_times)
-        slow_times_n = len(slow_times)
-        slowest_times_n = len(slowest_times)
+        def gradation(mask):
+            return int(np.count_nonzero(mask)), (int(np.mean(times[mask])) if mask.any() else 0)
 
-        fastest_times_mean = int(mean(fastest_times))
-        medium_times_mean = int(mean(medium_times))
-        slow_times_mean = int(mean(slow_times))
-        slowest_times_mean = int(mean(slowest_times))
+        fastest_times_n, fastest_times_mean = gradation(times < (mean_time - stdev_race_time))
+        medium_times_n, medium_times_mean = gradation(
+            ((mean_time - stdev_race_time) < times) & (times < (mean_time - (1 / 3 * stdev_race_time))))
+        slow_times_n, slow_times_mean = gradation(
+            ((mean_time - (1 / 3 * stdev_race_time)) < times) & (times < (mean_time + (1 / 3 * stdev_race_time))))
+        slowest_times_n, slowest_times_mean = gradation(times > (mean_time + (1 / 3 * stdev_race_time)))
 
         sd_1_low = mean_time - stdev_race_time
         sd_1_high = mean_time + stdev_race_time
@@ -610,84 +619,104 @@ def get_athlete(athlete_id: int):
     Gives athlete data and race list for specific athlete.
     """
     session = Scoped_Session()
-    athlete = session.query(model.Athlete).filter_by(id=int(athlete_id)).first()
-    athlete_race_boats = [race_boat.race_boat_id for race_boat in athlete.race_boats]
+    statement = (
+        select(model.Athlete, model.Athlete_Summary)
+        .outerjoin(model.Athlete_Summary, model.Athlete_Summary.athlete_id == model.Athlete.id)
+        .where(model.Athlete.id == int(athlete_id))
+    )
+    found = session.execute(statement).first()
+    if not found:
+        abort(404)
+    # summary is maintained by the scraper (missing for athletes without races)
+    athlete, summary = found
 
-    race_boats = session.query(model.Race_Boat).filter(model.Race_Boat.id.in_(athlete_race_boats)).all()
+    # race history in a single query, one row per race boat of the athlete, most recent race first
+    Venue_Country = aliased(model.Country)
+    statement = (
+        select(
+            model.Race_Boat.race_id,
+            model.Race_Boat.rank,
+            model.Race_Boat.result_time_ms,
+            model.Race.phase_type,
+            model.Race.phase_subtype,
+            model.Race.phase_number,
+            model.Race.date,
+            model.Gender.name.label("gender"),
+            model.Boat_Class.abbreviation.label("boat_class"),
+            model.Competition.name.label("competition"),
+            model.Venue.city.label("venue_city"),
+            Venue_Country.name.label("venue_country"),
+            model.Competition_Category.name.label("competition_category")
+        )
+        .select_from(model.Association_Race_Boat_Athlete)
+        .join(model.Association_Race_Boat_Athlete.race_boat)
+        .join(model.Race_Boat.race)
+        .join(model.Race.event)
+        .join(model.Event.competition)
+        .outerjoin(model.Event.gender)
+        .outerjoin(model.Event.boat_class)
+        .outerjoin(model.Competition.venue)
+        .outerjoin(Venue_Country, model.Venue.country)
+        .outerjoin(model.Competition.competition_type)
+        .outerjoin(model.Competition_Type.competition_category)
+        .where(model.Association_Race_Boat_Athlete.athlete_id == athlete.id)
+        .order_by(model.Race.date.desc(), model.Race_Boat.id)
+    )
+    rows = session.execute(statement).fetchall()
 
-    race_results, race_ids, athlete_boat_classes, best_time_boat_class, nation, race_phase = {}, [], set(), "", "", ""
-    total, gold, silver, bronze, final_a, final_b = 0, 0, 0, 0, 0, 0
+    race_results, athlete_boat_classes = {}, set()
+    gender, athlete_disciplines = set(), set()
 
-    for i, race_boat in enumerate(race_boats):
-        race_ids.append(race_boat.race_id)
-        boat = race_boat.race
-        phase = boat.phase_type
-        phase_num = boat.phase_number
-        phase_subtype = boat.phase_subtype if boat.phase_subtype else ""
+    for i, row in enumerate(rows):
+        phase = row.phase_type
+        phase_num = row.phase_number
+        phase_subtype = row.phase_subtype if row.phase_subtype else ""
         phase_string = globals.RACE_PHASE_MAPPING.get(phase + phase_subtype + str(phase_num))
         race_phase = phase_string if phase_string else phase + str(phase_num)
-        if phase == 'final' and phase_num == 1:
-            final_a += 1
-            if race_boat.rank == 1:
-                gold += 1
-                total += 1
-            elif race_boat.rank == 2:
-                silver += 1
-                total += 1
-            elif race_boat.rank == 3:
-                bronze += 1
-                total += 1
-        elif phase == 'final' and phase_num == 2:
-            final_b += 1
 
-        race_results[i] = {
-            "race_id": race_boat.race_id,
-            "rank": race_boat.rank,
-            "race_phase": race_phase,
-            "result_time": race_boat.result_time_ms
-        }
-        nation = race_boat.country.country_code
-
-    races = session.query(model.Race).order_by(model.Race.date.desc()).filter(model.Race.id.in_(race_ids)).all()
-
-    gender, athlete_disciplines = set(), set()
-    for i, race in enumerate(races):
-        gender.add(race.event.gender.name)
-        comp = session.query(model.Competition).filter(model.Competition.id == race.event.competition_id).one()
-        boat_class_name = race.event.boat_class.abbreviation
-        best_time_boat_class = str(race.event.boat_class.world_best_race_boat)
-        athlete_boat_classes.add(boat_class_name)
+        gender.add(row.gender)
+        if row.boat_class:
+            athlete_boat_classes.add(row.boat_class)
 
         # check disciplines
         if any(ath.endswith("x") for ath in athlete_boat_classes):
             athlete_disciplines.add("Skull")
-        elif not any(ath.endswith("x") for ath in athlete_boat_classes):
+        else:
             athlete_disciplines.add("Riemen")
 
-        comp_type = race.event.competition.competition_type.competition_category.name
-        race_results[i]["name"] = comp.name
-        race_results[i]["venue"] = f'{comp.venue.city}, {comp.venue.country.name}'
-        race_results[i]["boat_class"] = boat_class_name
-        race_results[i]["start_time"] = str((race.date).strftime("%Y-%m-%d %H:%M"))
-        race_results[i]["competition_category"] = comp_type
+        race_results[i] = {
+            "race_id": row.race_id,
+            "rank": row.rank,
+            "race_phase": race_phase,
+            "result_time": row.result_time_ms,
+            "name": row.competition,
+            "venue": f'{row.venue_city}, {row.venue_country}',
+            "boat_class": row.boat_class,
+            "start_time": row.date.strftime("%Y-%m-%d %H:%M") if row.date else None,
+            "competition_category": row.competition_category
+        }
+
+    gold = summary.medals_gold if summary else 0
+    silver = summary.medals_silver if summary else 0
+    bronze = summary.medals_bronze if summary else 0
 
     return json.dumps({
         "name": athlete.name,
         "athlete_id": athlete.id,
-        "nation": nation,
-        "gender": gender.pop(),
+        "nation": (summary.nation if summary else None) or "",
+        "gender": gender.pop() if gender else None,
         "dob": str(athlete.birthdate),
         "weight": athlete.weight_kg__,
         "height": athlete.height_cm__,
         "disciplines": list(athlete_disciplines),
         "boat_class": ", ".join(athlete_boat_classes),
-        "medals_total": total,
+        "medals_total": gold + silver + bronze,
         "medals_gold": gold,
         "medals_silver": silver,
         "medals_bronze": bronze,
-        "final_a": final_a,
-        "final_b": final_b,
-        "num_of_races": len(athlete_race_boats),
+        "final_a": summary.final_a if summary else 0,
+        "final_b": summary.final_b if summary else 0,
+        "num_of_races": summary.race_count if summary else 0,
         "race_list": race_results,
     })
 
@@ -697,89 +726,106 @@ def get_athlete(athlete_id: int):
 def get_athlete_by_name():
     """
     Delivers the athlete search result depending on the search query.
-    @Params: search_query string and filter data
+    @Params: search_query string and filter data, optional page (1-based) and page_size
+    @Returns: results of the requested page, total number of matches, page and the page_size actually
+    applied (requested page_size capped at max_page_size). Invalid page or page_size -> 400.
     """
     data = request.json["data"]
-    search_query = data["search_query"]
+    search_terms = normalize_name(data["search_query"]).split()
     birth_year = data["birth_year"]
     nation = data["nation"][:3] if data["nation"] else None
     boat_class = data["boat_class"]
+    try:
+        page = int(data.get("page") or 1)
+        page_size = int(data.get("page_size") or ATHLETE_SEARCH_PAGE_SIZE)
+    except (TypeError, ValueError):
+        abort(400)
+    if page < 1 or page_size < 1:
+        abort(400)
+    page_size = min(page_size, ATHLETE_SEARCH_MAX_PAGE_SIZE)
 
-    session = Scoped_Session()
-    athletes = session.query(model.Athlete).filter(
-        or_(
-            model.Athlete.first_name__.ilike(search_query),
-            model.Athlete.last_name__.ilike(search_query)
-        )
-    ).all()
-    output_athletes = set(athletes)
-    if nation or boat_class:
-        output_athletes = set()
-        for athlete in athletes:
-            athlete_race_boat_ids = [race_boat.race_boat_id for race_boat in athlete.race_boats]
-            race_boats = session.query(model.Race_Boat).filter(model.Race_Boat.id.in_(athlete_race_boat_ids)).all()
-            athlete_nations = set(race_boat.country.country_code for race_boat in race_boats)
-            race_ids = [race_boat.race_id for race_boat in race_boats]
-            races = session.query(model.Race).filter(model.Race.id.in_(race_ids)).all()
-            race_boat_classes = set(race.event.boat_class.additional_id_ for race in races)
-            if nation and nation in athlete_nations:
-                output_athletes.add(athlete)
-            if boat_class and boat_class in race_boat_classes:
-                output_athletes.add(athlete)
+    result = {
+        "results": [],
+        "total": 0,
+        "page": page,
+        "page_size": page_size,
+        "max_page_size": ATHLETE_SEARCH_MAX_PAGE_SIZE,
+    }
+    if not search_terms:
+        return json.dumps(result)
+
+    # prefix match of every search term on the normalized name, uses the full text index ix_athletes_name_search
+    name_vector = func.to_tsvector(literal_column("'simple'"), model.Athlete.name_normalized)
+    name_query = func.to_tsquery(literal_column("'simple'"), " & ".join(f"{term}:*" for term in search_terms))
 
+    statement = select(model.Athlete).where(name_vector.op("@@")(name_query))
+    if nation or boat_class:
+        facets = []
+        if nation:
+            facets.append(model.Athlete_Summary.nations.contains([nation]))
+        if boat_class:
+            facets.append(model.Athlete_Summary.boat_classes.contains([boat_class]))
+        statement = statement.join(model.Athlete_Summary, model.Athlete_Summary.athlete_id == model.Athlete.id).where(or_(*facets))
     if birth_year:
-        output_athletes = [athlete for athlete in output_athletes if athlete.birthdate.year == birth_year]
+        statement = statement.where(extract("year", model.Athlete.birthdate) == birth_year)
 
-    return json.dumps([{
+    session = Scoped_Session()
+    result["total"] = session.execute(select(func.count()).select_from(statement.subquery())).scalar()
+
+    statement = (
+        statement
+        .order_by(func.ts_rank(name_vector, name_query).desc(), model.Athlete.name, model.Athlete.id)
+        .limit(page_size)
+        .offset((page - 1) * page_size)
+    )
+    athletes = session.execute(statement).scalars().all()
+
+    result["results"] = [{
         "name": f"{athlete.last_name__}, {athlete.first_name__} ({athlete.birthdate})",
         "id": athlete.id,
-    } for athlete in output_athletes])
+    } for athlete in athletes]
+    return json.dumps(result)
 
 
 @app.route('/get_athletes_filter_options', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_athletes_filter_options():
     """
     Delivers the filter options for the athletes page.
     """
-    session = Scoped_Session()
-    iterator = session.execute(select(model.Athlete)).scalars()
-    birth_years = [entity.birthdate.year for entity in iterator]
-    nations = {entity.country_code: entity.name for entity in session.execute(select(model.Country)).scalars()}
+    options = get_filter_options(Scoped_Session())
+    min_birth_year, max_birth_year = options['birth_years']
 
     return json.dumps([{
         "birth_years": [
-            {"start_year": min(birth_years)},
-            {"end_year": max(birth_years)}],
-        "nations": dict(sorted(nations.items(), key=lambda x: x[0])),
+            {"start_year": min_birth_year},
+            {"end_year": max_birth_year}],
+        "nations": options['nations'],
         "boat_classes": globals.BOATCLASSES_BY_GENDER_AGE_WEIGHT
     }], sort_keys=False)
 
 
 @app.route('/get_teams_filter_options', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_teams_filter_options():
     """
         Delivers the filter options for the teams page.
         """
-    session = Scoped_Session()
-    min_year, max_year = session.query(func.min(model.Competition.year), func.max(model.Competition.year)).first()
-    statement = select(model.Competition_Type.additional_id_, model.Competition_Type.abbreviation)
-    competition_categories = [{
-        "id": v[0],
-        "display_name": v[1],
-    } for v in session.execute(statement).fetchall()]
-    nations = {entity.country_code: entity.name for entity in session.execute(select(model.Country)).scalars()}
+    options = get_filter_options(Scoped_Session())
+    min_year, max_year = options['years']
 
     return json.dumps([{
         "years": [{"start_year": min_year}, {"end_year": max_year}],
-        "competition_categories": sorted(competition_categories, key=lambda x: x['display_name']),
-        "nations": dict(sorted(nations.items(), key=lambda x: x[0]))
+        "competition_categories": options['competition_types'],
+        "nations": options['nations']
     }], sort_keys=False)
 
 
 @app.route('/get_teams', methods=['POST'])
 @jwt_required()
+@cached_response
 def get_teams():
     """
     This endpoint serves the teams data for a given nation and further filter criteria.
@@ -792,41 +838,46 @@ def get_teams():
 
     session = Scoped_Session()
 
-    # get all race boats for given nation
-    race_boats = session.query(model.Race_Boat) \
-        .join(model.Country, model.Race_Boat.country_id == model.Country.id) \
-        .join(model.Race, model.Race_Boat.race_id == model.Race.id) \
-        .join(model.Race.event)\
-        .join(model.Event.competition)\
-        .join(model.Competition.competition_type)\
-        .join(model.Competition_Type.competition_category)\
-        .filter(model.Country.country_code == str(nation)) \
-        .filter(model.Race.date >= start_date) \
-        .filter(model.Race.date <= end_date) \
-        .filter(model.Competition_Type.additional_id_.in_(comp_types)) \
-        .all()
-
-    athletes = set()
-    for race_boat in race_boats:
-        boat_class = race_boat.race.event.boat_class.additional_id_
-        athlete_assoc: model.Association_Race_Boat_Athlete
-        for idx, athlete_assoc in enumerate(race_boat.athletes):
-            athlete: model.Athlete = athlete_assoc.athlete
-            athletes.add((athlete.name, athlete.id, boat_class))
+    def _filter(statement):
+        return (
+            statement
+            .join(model.Race_Boat.country)
+            .join(model.Race_Boat.race)
+            .join(model.Race.event)
+            .join(model.Event.competition)
+            .join(model.Competition.competition_type)
+            .join(model.Competition_Type.competition_category)
+            .where(
+                model.Country.country_code == str(nation),
+                model.Race.date >= start_date,
+                model.Race.date <= end_date,
+                model.Competition_Type.additional_id_.in_(comp_types)
+            )
+        )
 
-    num_of_results = len(athletes)
-    result = {}
-    for entry in athletes:
-        name, id, key = entry
-        if key not in result:
-            result[key] = [{"name": name, "id": id}]
-        else:
-            result[key].append({"name": name, "id": id})
+    # all athletes that rowed for the nation, per boat class
+    roster_statement = _filter(
+        select(model.Boat_Class.additional_id_, model.Athlete.id, model.Athlete.name)
+        .distinct()
+        .select_from(model.Race_Boat)
+        .join(model.Race_Boat.athletes)
+        .join(model.Association_Race_Boat_Athlete.athlete)
+    ).outerjoin(
+        model.Event.boat_class
+    ).order_by(model.Boat_Class.additional_id_, model.Athlete.name, model.Athlete.id)
+
+    num_race_boats_statement = _filter(select(func.count(model.Race_Boat.id)).select_from(model.Race_Boat))
+
+    num_of_results, result = 0, {}
+    for boat_class, athlete_id, name in session.execute(roster_statement):
+        num_of_results += 1
+        result.setdefault(boat_class, []).append({"name": name, "id": athlete_id})
+    num_race_boats = session.execute(num_race_boats_statement).scalar()
 
     return {
         "interval": [data["interval"][0], data["interval"][1]],
         "nation": data["nation"],
-        "race_boats": str(len(race_boats)),
+        "race_boats": str(num_race_boats),
         "results": num_of_results,
         "athletes": result,
         "boat_classes": globals.BOATCLASSES_BY_GENDER_AGE_WEIGHT
@@ -834,35 +885,30 @@ def get_teams():
 
 @app.route('/get_medals_filter_options', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_medals_filter_options():
     """
     Delivers the filter options for the medals page.
     """
-    session = Scoped_Session()
-    min_year, max_year = session.query(func.min(model.Competition.year), func.max(model.Competition.year)).first()
-
-    statement = select(model.Competition_Type.additional_id_, model.Competition_Type.abbreviation)
-    competition_categories = [{
-        "id": v[0],
-        "display_name": v[1],
-    } for v in session.execute(statement).fetchall()]
-    nations = {entity.country_code: entity.name for entity in session.execute(select(model.Country)).scalars()}
+    options = get_filter_options(Scoped_Session())
+    min_year, max_year = options['years']
 
     return json.dumps([{
         "years": [{"start_year": min_year}, {"end_year": max_year}],
-        "competition_categories": sorted(competition_categories, key=lambda x: x['display_name']),
+        "competition_categories": options['competition_types'],
         "medal_types": [
             {"display_name": "Gesamt", "id": "0"},
             {"display_name": "Olympisch", "id": "1"},
             {"display_name": "Nicht-Olympisch", "id": "2"}
         ],
-        "nations": dict(sorted(nations.items(), key=lambda x: x[0])),
+        "nations": options['nations'],
         "boat_classes": globals.BOATCLASSES_BY_GENDER_AGE_WEIGHT,
     }], sort_keys=False)
 
 
 @app.route('/get_medals', methods=['POST'])
 @jwt_required()
+@cached_response
 def get_medals():
     data = request.json["data"]
     start, end = data["years"][0], data["years"][1]
@@ -873,60 +919,56 @@ def get_medals():
 
     session = Scoped_Session()
 
-    nation_ids = [country.id for country in
-                  session.query(model.Country.id).filter(model.Country.country_code.in_(nations)).all()]
-
-    race_boats = (
-        session.query(model.Race_Boat)
-        .join(model.Race)
-        .join(model.Event)
-        .join(model.Boat_Class)
-        .join(model.Competition)
-        .join(model.Competition_Type)
-        .filter(
-            model.Race_Boat.country_id.in_(nation_ids),
-            model.Race.date >= start_date,
-            model.Race.date <= end_date,
-            model.Competition_Type.additional_id_.in_(comp_types)
+    def _filter(statement):
+        return (
+            statement
+            .join(model.Race_Boat.race)
+            .join(model.Race.event)
+            .join(model.Event.boat_class)
+            .join(model.Event.competition)
+            .join(model.Competition.competition_type)
+            .join(model.Race_Boat.country)
+            .where(
+                model.Country.country_code.in_(nations),
+                model.Race.date >= start_date,
+                model.Race.date <= end_date,
+                model.Competition_Type.additional_id_.in_(comp_types)
+            )
         )
-        .options(
-            joinedload(model.Race_Boat.country),
-            joinedload(model.Race_Boat.race),
+
+    is_final_a = and_(model.Race.phase_type == 'final', model.Race.phase_number == 1)
+    is_final_b = and_(model.Race.phase_type == 'final', model.Race.phase_number == 2)
+    rank = model.Race_Boat.rank
+    gold = func.count().filter(and_(is_final_a, rank == 1))
+    medals_statement = _filter(
+        select(
+            model.Country.country_code.label("nation"),
+            func.count().filter(and_(is_final_a, rank.between(1, 3))).label("total"),
+            gold.label("gold"),
+            func.count().filter(and_(is_final_a, rank == 2)).label("silver"),
+            func.count().filter(and_(is_final_a, rank == 3)).label("bronze"),
+            func.count().filter(and_(is_final_a, rank > 3, rank <= 6)).label("four_to_six"),
+            func.count().filter(is_final_a).label("final_a"),
+            func.count().filter(is_final_b).label("final_b")
         )
-        .all()
+        .select_from(model.Race_Boat)
+    ).where(
+        or_(is_final_a, is_final_b)
+    ).group_by(
+        model.Country.country_code
+    ).order_by(
+        gold.desc(), model.Country.country_code
     )
+    comp_types_statement = _filter(
+        select(model.Competition_Type.abbreviation).distinct().select_from(model.Race_Boat)
+    ).order_by(model.Competition_Type.abbreviation)
 
-    medal_data, total_result_counter, comp_types = {}, 0, set()
-    for race_boat in race_boats:
-        comp_types.add(race_boat.race.event.competition.competition_type.abbreviation)
-        if race_boat.race.phase_type == 'final' and race_boat.race.phase_number == 1 and race_boat.country.country_code in nations:
-            total_result_counter += 1
-            nation = race_boat.country.country_code
-            if nation not in medal_data:
-                medal_data[nation] = {"total": 0, "gold": 0, "silver": 0, "bronze": 0, "four_to_six": 0, "final_a": 0, "final_b": 0}
-            medal_data[nation]["final_a"] += 1
-            if race_boat.rank == 1:
-                medal_data[nation]["gold"] += 1
-                medal_data[nation]["total"] += 1
-            elif race_boat.rank == 2:
-                medal_data[nation]["silver"] += 1
-                medal_data[nation]["total"] += 1
-            elif race_boat.rank == 3:
-                medal_data[nation]["bronze"] += 1
-                medal_data[nation]["total"] += 1
-            elif 3 < race_boat.rank <= 6:
-                medal_data[nation]["four_to_six"] += 1
-        elif race_boat.race.phase_type == 'final' and race_boat.race.phase_number == 2 and race_boat.country.country_code in nations:
-            nation = race_boat.country.country_code
-            if nation not in medal_data:
-                medal_data[nation] = {"total": 0, "gold": 0, "silver": 0, "bronze": 0, "four_to_six": 0, "final_a": 0, "final_b": 0}
-            medal_data[nation]["final_b"] += 1
-
-    medal_data = [{"nation": nation, **medal_data[nation]} for nation in medal_data]
-    medal_data.sort(key=lambda x: x['gold'], reverse=True)
-
-    for i in range(len(medal_data)):
-        medal_data[i]['rank'] = i + 1
+    medal_data = [
+        {**row._asdict(), "rank": i + 1}
+        for i, row in enumerate(session.execute(medals_statement))
+    ]
+    total_result_counter = sum(row["final_a"] for row in medal_data)
+    comp_types = [abbreviation for abbreviation in session.execute(comp_types_statement).scalars() if abbreviation]
 
     return json.dumps({
         "results": total_result_counter,
@@ -940,27 +982,23 @@ def get_medals():
 
 @app.route('/get_report_filter_options', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_report_filter_options():
     """
     Delivers the filter options for the report page.
     Note: preserving the order of the key's important for rendering in the frontend.
     """
-    session = Scoped_Session()
-    min_year, max_year = session.query(func.min(model.Competition.year), func.max(model.Competition.year)).first()
-
-    statement = select(model.Competition_Type.additional_id_, model.Competition_Type.abbreviation).where(
-        model.Competition_Type.abbreviation.in_(globals.RELEVANT_CMP_TYPE_ABBREVATIONS)
-    )
-    competition_categories = [{
-        "id": v[0],
-        "display_name": v[1],
-    } for v in session.execute(statement).fetchall()]
-    sorted_categories = sorted(competition_categories, key=lambda x: x['display_name'])
+    options = get_filter_options(Scoped_Session())
+    min_year, max_year = options['years']
+    competition_categories = [
+        competition_type for competition_type in options['competition_types']
+        if competition_type['display_name'] in globals.RELEVANT_CMP_TYPE_ABBREVATIONS
+    ]
 
     return json.dumps([{
         "years": [{"start_year": min_year}, {"end_year": max_year}],
         "boat_classes": globals.BOATCLASSES_BY_GENDER_AGE_WEIGHT,
-        "competition_categories": sorted_categories,
+        "competition_categories": competition_categories,
         "runs": globals.RACE_PHASE_SUBTYPE_BY_RACE_PHASE,
         "ranks": [1, 2, 3, 4, 5, 6]
     }], sort_keys=False)
@@ -968,6 +1006,7 @@ def get_report_filter_options():
 
 @app.route('/calendar/<int:year>', methods=['GET'])
 @jwt_required()
+@cached_response
 def get_calendar(year: int):
     """
     This route delivers calendar data for all competitions.
@@ -0,0 +1,134 @@
+"""
+Server-side response cache for the read-only endpoints.
+
+The data behind the API only changes when the scraper finished a pass, which then bumps the data
+version (model.Data_Version). Responses are cached in memory (per process), keyed by endpoint and
+normalized request (path, query args, JSON body). All entries are dropped as soon as the data version
+changes. The version is re-read at most every API_CACHE_VERSION_TTL seconds, so a new scraper pass
+becomes visible with that delay. Least recently used entries are evicted beyond API_CACHE_MAX_ENTRIES.
+
+Responses carry a strong ETag derived from CACHE_SCHEMA_VERSION, the data version and the request key. A request whose
+If-None-Match matches is answered with 304 before the view runs (no db access apart from the
+memoized data version). "Cache-Control: private, no-cache" makes clients revalidate every time.
+
+Usage (below the auth decorator, so that only authorized requests are served from the cache):
+    @app.route('/matrix', methods=['POST'])
+    @jwt_required()
+    @cached_response
+    def get_matrix(): ...
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+from flask import request, current_app, Response
+from sqlalchemy import select
+
+from model import model
+
+import logging
+logger = logging.getLogger(__name__)
+
+# max. number of cached responses per process (0 -> cache disabled)
+API_CACHE_MAX_ENTRIES = int(os.environ.get('API_CACHE_MAX_ENTRIES', '256').strip())
+
+# seconds the data version is trusted before it is read again from the db
+API_CACHE_VERSION_TTL = float(os.environ.get('API_CACHE_VERSION_TTL', '10').strip())
+
+# part of every ETag and cache key: bump it whenever the response of a cached endpoint changes
+# for the same data (new fields, changed format), deployments may append their build id
+CACHE_SCHEMA_VERSION = (1, os.environ.get('API_BUILD_VERSION', '').strip())
+
+
+class Response_Cache:
+    """Thread-safe LRU mapping of request keys to responses of a single data version"""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _set_version(self, version) -> None:
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, version, key):
+        with self._lock:
+            self._set_version(version)
+            entry = self._entries.get(key)
+            if entry != None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, version, key, entry) -> None:
+        with self._lock:
+            self._set_version(version)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_cache = Response_Cache(API_CACHE_MAX_ENTRIES)
+_data_version = {'version': None, 'expires': 0.}
+
+
+def get_data_version() -> int:
+    """Current data version, memoized for API_CACHE_VERSION_TTL seconds"""
+    now = time.monotonic()
+    if now >= _data_version['expires']:
+        session = model.Scoped_Session()
+        version = session.execute(select(model.Data_Version.version)).scalar()
+        _data_version['version'] = version or 0
+        _data_version['expires'] = now + API_CACHE_VERSION_TTL
+    return _data_version['version']
+
+
+def request_key() -> tuple:
+    """Identifies a request independently of the order of query args and JSON keys"""
+    body = request.get_json(silent=True)
+    if body != None:
+        body = json.dumps(body, sort_keys=True, separators=(',', ':'))
+    else:
+        body = request.get_data(as_text=True)
+    return request.method, request.path, tuple(sorted(request.args.items(multi=True))), body
+
+
+def request_etag(version, key) -> str:
+    """Strong ETag: same (schema, data) version and same request -> same response body"""
+    return hashlib.sha256(repr((version, key)).encode('utf-8')).hexdigest()[:32]
+
+
+def _set_validators(response: Response, etag: str) -> Response:
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cached_response(view):
+    """Decorator for views whose response only depends on the request and the scraped data"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version, key = (CACHE_SCHEMA_VERSION, get_data_version()), request_key()
+        etag = request_etag(version, key)
+        if request.if_none_match.contains(etag):
+            return _set_validators(Response(status=304), etag)
+
+        entry = _cache.get(version, key) if API_CACHE_MAX_ENTRIES > 0 else None
+        if entry != None:
+            body, status, headers = entry
+            return _set_validators(Response(body, status=status, headers=headers), etag)
+
+        response = current_app.make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.direct_passthrough:
+            return response
+        if API_CACHE_MAX_ENTRIES > 0:
+            _cache.put(version, key, (response.get_data(), response.status_code, list(response.headers)))
+        return _set_validators(response, etag)
+    return wrapper
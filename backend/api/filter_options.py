@@ -0,0 +1,57 @@
+"""
+Facets shared by the *_filter_options endpoints (years, competition types, nations, birth years).
+Computed with a few aggregate queries and kept in memory until the scraper bumps the data version.
+"""
+
+import threading
+
+from sqlalchemy import select, func, extract
+
+from model import model
+from .cache import get_data_version
+
+_lock = threading.Lock()
+_snapshot = {'version': None, 'data': None}
+
+
+def _none_last(value) -> tuple:
+    return value == None, value or ''
+
+
+def _compute(session) -> dict:
+    min_year, max_year = session.execute(
+        select(func.min(model.Competition.year), func.max(model.Competition.year))
+    ).one()
+
+    statement = select(model.Competition_Type.additional_id_, model.Competition_Type.abbreviation)
+    competition_types = sorted([{
+        "id": additional_id_,
+        "display_name": abbreviation,
+    } for additional_id_, abbreviation in session.execute(statement)], key=lambda x: _none_last(x['display_name']))
+
+    statement = select(model.Country.country_code, model.Country.name).order_by(model.Country.id)
+    nations = {country_code: name for country_code, name in session.execute(statement)}
+    nations = dict(sorted(nations.items(), key=lambda x: _none_last(x[0])))
+
+    birth_year = extract('year', model.Athlete.birthdate)
+    min_birth_year, max_birth_year = session.execute(select(func.min(birth_year), func.max(birth_year))).one()
+
+    return {
+        "years": (min_year, max_year),
+        "competition_types": competition_types,
+        "nations": nations,
+        "birth_years": (
+            int(min_birth_year) if min_birth_year != None else None,
+            int(max_birth_year) if max_birth_year != None else None
+        ),
+    }
+
+
+def get_filter_options(session) -> dict:
+    """Snapshot of the facets for the current data version. Treat as read-only."""
+    version = get_data_version()
+    with _lock:
+        if _snapshot['version'] != version or _snapshot['data'] == None:
+            _snapshot['data'] = _compute(session)
+            _snapshot['version'] = version
+        return _snapshot['data']
@@ -5,7 +5,7 @@ import itertools
 import statistics
 from collections.abc import Iterable
 
-from sqlalchemy import select, or_, and_, func
+from sqlalchemy import select, and_, func
 
 from common.helpers import stepfunction
 from model import model
@@ -14,10 +14,8 @@ COND_VALID_2000M_RESULTS = and_(
     model.Intermediate_Time.distance_meter == 2000,
     model.Intermediate_Time.result_time_ms != None,
     model.Intermediate_Time.invalid_mark_result_code_id == None,
-    or_(
-        model.Intermediate_Time.is_outlier == False,
-        model.Intermediate_Time.is_outlier == None
-    )
+    # is_outlier is NOT NULL; a plain comparison lets the planner use ix_intermediate_times_valid_2000m
+    model.Intermediate_Time.is_outlier == False
 )
 
 def result_time_best_of_year_interval(session, boat_class_id, year_start,
@@ -1,4 +1,5 @@
 import re
+import unicodedata
 from datetime import datetime
 
 def get_(data, key, default=None):
@@ -11,6 +12,24 @@ def get_(data, key, default=None):
     return data.get(key, default)
 
 
+# letters that are not decomposed by unicode normalization
+__NAME_FOLDING = str.maketrans({'ø': 'o', 'ł': 'l', 'đ': 'd', 'ð': 'd', 'þ': 'th', 'æ': 'ae', 'œ': 'oe', 'ı': 'i'})
+
+def normalize_name(name: str) -> str:
+    """Accent-folded, lowercase words of name separated by single spaces.
+    E.g. "KRAJANGJAM, Nuntida" -> "krajangjam nuntida"; "Bjørn Émile" -> "bjorn emile"
+    """
+    if not name:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', name.casefold().translate(__NAME_FOLDING))
+    folded = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', folded))
+
+
+def normalize_athlete_name(first_name: str, last_name: str, display_name: str) -> str:
+    return normalize_name(f'{first_name or ""} {last_name or ""}') or normalize_name(display_name)
+
+
 def int_(s):
     is_digit_str = isinstance(s, str) and s.isdigit()
     is_int = isinstance(s, int)
@@ -1,15 +1,17 @@
 from sqlalchemy import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload, selectinload
 
-from contextlib import suppress
+from contextlib import suppress, contextmanager
 import datetime as dt
 
-from common.helpers import Timedelta_Parser, parse_wr_intermediate_distance_key, get_, select_first
+from common.helpers import Timedelta_Parser, parse_wr_intermediate_distance_key, get_, select_first, normalize_athlete_name
 from common import rowing
 
 from scraping_wr import api
 
 from . import model
+from . import migrations
 from .model import engine, Scoped_Session
 
 
@@ -22,11 +24,24 @@ def create_tables(engine):
     # create all tables (init) if they don't exist
     model.Base.metadata.create_all(engine, checkfirst=True)
 
+    # create_all() does not alter existing tables -> versioned migrations (see model/migrations.py)
+    migrations.migrate(engine)
+
 
 def drop_all_tables(engine):
     model.Base.metadata.drop_all(engine, checkfirst=True)
 
 
+def bump_data_version(session) -> int:
+    """Increments the data version (invalidates API response caches). Returns the new version. No commit."""
+    statement = insert(model.Data_Version).values(id=1, version=1, updated_at=dt.datetime.now())
+    statement = statement.on_conflict_do_update(
+        index_elements=[model.Data_Version.id],
+        set_={'version': model.Data_Version.version + 1, 'updated_at': statement.excluded.updated_at}
+    ).returning(model.Data_Version.version)
+    return session.execute(statement).scalar()
+
+
 def query_by_uuid_(session, Entity_Class, uuid):
     """Helper function.
     If an entity with given uuid exists:
@@ -34,6 +49,10 @@ def query_by_uuid_(session, Entity_Class, uuid):
     If not existing:
         returns None
     """
+    found, result_entity = _uuid_cache_lookup(session, Entity_Class, uuid.lower())
+    if found:
+        return result_entity
+
     # 1.4 / 2.0 https://docs.sqlalchemy.org/en/14/orm/queryguide.html
     # 2.0 https://docs.sqlalchemy.org/en/20/orm/queryguide/select.html#selecting-orm-entities
     statement = select(Entity_Class).where(Entity_Class.additional_id_ == uuid.lower())
@@ -41,6 +60,99 @@ def query_by_uuid_(session, Entity_Class, uuid):
     return result_entity
 
 
+# payload key -> entity class (keys of the World Rowing API payload holding entities with an uuid)
+WR_PAYLOAD_ENTITIES = {
+    'competitionType': model.Competition_Type,
+    'competitionCategory': model.Competition_Category,
+    'venue': model.Venue,
+    'country': model.Country,
+    'events': model.Event,
+    'boatClass': model.Boat_Class,
+    'gender': model.Gender,
+    'races': model.Race,
+    'raceBoats': model.Race_Boat,
+    'person': model.Athlete,
+}
+
+# relationships traversed by the mappers, loaded along with the preloaded entities
+UUID_CACHE_LOADER_OPTIONS = {
+    model.Event: [ selectinload(model.Event.races) ],
+    model.Race: [ selectinload(model.Race.race_boats) ],
+    model.Race_Boat: [
+        selectinload(model.Race_Boat.athletes).joinedload(model.Association_Race_Boat_Athlete.athlete),
+        selectinload(model.Race_Boat.intermediates),
+        selectinload(model.Race_Boat.race_data),
+    ],
+}
+
+UUID_CACHE_KEY = 'uuid_cache'
+UUID_CACHE_CHUNK_SIZE = 5000
+
+
+def _collect_payload_uuids(data, uuids: dict) -> dict:
+    """Walks a (nested) World Rowing API payload. Returns dict: Entity_Class -> set of uuids"""
+    if isinstance(data, list):
+        for item in data:
+            _collect_payload_uuids(item, uuids)
+    elif isinstance(data, dict):
+        for key, value in data.items():
+            Entity_Class = WR_PAYLOAD_ENTITIES.get(key)
+            if Entity_Class:
+                for item in (value if isinstance(value, list) else [value]):
+                    if isinstance(item, dict) and item.get('id'):
+                        uuids.setdefault(Entity_Class, set()).add(item['id'].lower())
+            if isinstance(value, (list, dict)):
+                _collect_payload_uuids(value, uuids)
+    return uuids
+
+
+def _uuid_cache_lookup(session, Entity_Class, uuid):
+    """Returns tuple: found, entity (entity can be None: known not to exist in db)"""
+    cache = session.info.get(UUID_CACHE_KEY)
+    if cache == None or not (Entity_Class, uuid) in cache:
+        return False, None
+    return True, cache[(Entity_Class, uuid)]
+
+
+def _uuid_cache_register(session, Entity_Class, key, entity):
+    cache = session.info.get(UUID_CACHE_KEY)
+    if cache != None:
+        cache[(Entity_Class, key)] = entity
+
+
+@contextmanager
+def uuid_cache(session, data: dict):
+    """Per-scrape identity map for wr_insert(). Preloads all entities referenced by the payload data
+    with a single IN query per entity class, so that wr_insert() resolves them (and detects new ones)
+    from memory instead of one SELECT per entity. The cache is dropped when the context is left.
+    Usage:
+        with uuid_cache(session, competition_data):
+            wr_map_competition_scrape(session, competition, competition_data)
+    """
+    cache = {}
+    for Entity_Class, uuids in _collect_payload_uuids(data, {}).items():
+        uuids = list(uuids)
+        for uuid in uuids:
+            cache[(Entity_Class, uuid)] = None
+        for idx in range(0, len(uuids), UUID_CACHE_CHUNK_SIZE):
+            statement = (
+                select(Entity_Class)
+                .where(Entity_Class.additional_id_.in_(uuids[idx:idx+UUID_CACHE_CHUNK_SIZE]))
+                .options(*UUID_CACHE_LOADER_OPTIONS.get(Entity_Class, []))
+            )
+            for entity in session.scalars(statement):
+                cache[(Entity_Class, entity.additional_id_)] = entity
+
+    for entity in session.scalars(select(model.Invalid_Mark_Result_Code)):
+        cache[(model.Invalid_Mark_Result_Code, entity.id)] = entity
+
+    session.info[UUID_CACHE_KEY] = cache
+    try:
+        yield cache
+    finally:
+        session.info.pop(UUID_CACHE_KEY, None)
+
+
 def wr_insert(session, Entity_Class, map_func, data, overwrite_existing=True, add_session=True, **kwargs):
     """Proxy function to fetch or create an entity.
     Usage: wr_insert(session, model.Country, wr_map_country, data_dict)"""
@@ -54,6 +166,7 @@ def wr_insert(session, Entity_Class, map_func, data, overwrite_existing=True, ad
     if create_entity:
         entity = Entity_Class()
         entity.additional_id_ = uuid
+        _uuid_cache_register(session, Entity_Class, uuid, entity)
 
     if create_entity or overwrite_existing:
         entity = map_func(session, entity, data, **kwargs)
@@ -87,6 +200,7 @@ def wr_map_athlete(session, entity, data):
     entity.name = get_(data, 'DisplayName')
     entity.first_name__ = get_(data, 'FirstName')
     entity.last_name__ = get_(data, 'LastName')
+    entity.name_normalized = normalize_athlete_name(entity.first_name__, entity.last_name__, entity.name)
     with suppress(TypeError, ValueError):
         entity.birthdate = dt.datetime.fromisoformat(get_(data, 'BirthDate', '')).date()
 
@@ -111,7 +225,9 @@ def wr_insert_invalid_mark_result_code(session, data):
     if not abbreviation:
         return None
 
-    entity = session.get(Entity_Class, {'id': abbreviation})
+    found, entity = _uuid_cache_lookup(session, Entity_Class, abbreviation)
+    if not found:
+        entity = session.get(Entity_Class, {'id': abbreviation})
     create_entity = entity == None
 
     if create_entity:
@@ -119,6 +235,7 @@ def wr_insert_invalid_mark_result_code(session, data):
         entity.id = abbreviation
         entity.name = get_(data, 'code')
         session.add(entity)
+        _uuid_cache_register(session, Entity_Class, abbreviation, entity)
     
     return entity
 
@@ -353,6 +470,7 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-c", "--create", help="Create tables if not yet existing", action="store_true")
     parser.add_argument("-d", "--drop", help="Drop all tables described by the schema defined in model.py", action="store_true")
+    parser.add_argument("-m", "--migrate", help="Apply pending schema migrations (see model/migrations.py)", action="store_true")
     parser.add_argument("-i", "--insert", help="Import JSON data for a rowing competition")
     args = parser.parse_args()
     print(args)
@@ -370,11 +488,16 @@ if __name__ == '__main__':
         logger.info("----- Create Tables -----")
         create_tables(engine)
 
+    if args.migrate:
+        logger.info("----- Migrate Schema -----")
+        migrations.migrate(engine)
+
     if args.insert:
         logger.info(f"Load JSON file: {args.insert}")
         with Scoped_Session() as session:
             with open(args.insert, mode="r", encoding="utf-8") as fp:
                 competition_data = json.load(fp)
-            competition = wr_insert(session, model.Competition, wr_map_competition_scrape, competition_data)
+            with uuid_cache(session, competition_data):
+                competition = wr_insert(session, model.Competition, wr_map_competition_scrape, competition_data)
             session.commit()
     
@@ -0,0 +1,221 @@
+"""
+Versioned schema migrations
+
+Base.metadata.create_all() only creates missing tables. Changes to existing tables (columns, indexes, ...)
+are deployed by the migrations in MIGRATIONS. Applied versions are recorded in the table "schema_migrations".
+A postgres advisory lock serializes concurrent runs (e.g. several containers starting at once).
+
+Rules for new migrations:
+- Append only, never edit an applied migration. Versions are increasing integers.
+- Statements have to be idempotent (IF NOT EXISTS, ...): on a fresh database create_all() already created
+  the current schema before the migrations run.
+- Data migrations that need python go into "run": function(connection), called in the same transaction as
+  "statements" (after them). Has to be idempotent as well.
+- Indexes are listed under "indexes" and built with CREATE INDEX CONCURRENTLY (no write lock on the table),
+  after the statements. Such a migration cannot run in a transaction; an index left invalid by an interrupted
+  build is rebuilt.
+
+Usage:
+    python -m model.dbutils --migrate
+"""
+
+import time
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from common.helpers import normalize_athlete_name
+
+import logging
+logger = logging.getLogger(__name__)
+
+# arbitrary, but fixed key for pg_advisory_lock()
+MIGRATIONS_LOCK_KEY = 0x5C4E3A
+MIGRATIONS_LOCK_POLL_SECONDS = 1.
+
+
+def _backfill_athlete_names(connection):
+    rows = connection.execute(text(
+        "SELECT id, first_name__, last_name__, name FROM athletes WHERE name_normalized IS NULL"
+    )).all()
+    params = [
+        {'id': id_, 'name_normalized': normalize_athlete_name(first_name, last_name, name)}
+        for id_, first_name, last_name, name in rows
+    ]
+    if params:
+        connection.execute(text("UPDATE athletes SET name_normalized = :name_normalized WHERE id = :id"), params)
+    logger.info(f'Normalized athlete names N={len(params)}')
+
+
+def _rebuild_athlete_summaries(connection):
+    # imported here: postprocessing depends on the model package
+    from scraper_procedures.postprocessing import refresh_athlete_summaries
+    with Session(bind=connection) as session:
+        written = refresh_athlete_summaries(session=session)
+        # ends the session's transaction only, the connection's transaction is committed by _apply()
+        session.commit()
+    logger.info(f'Rebuilt athlete summaries N={written}')
+
+
+def _build_boat_class_statistics(connection):
+    # imported here: postprocessing depends on the model package
+    from scraper_procedures.postprocessing import refresh_boat_class_statistics
+    with Session(bind=connection) as session:
+        written = refresh_boat_class_statistics(session=session)
+        session.commit()
+    logger.info(f'Built boat class statistics N={written}')
+
+
+MIGRATIONS = [
+    {
+        'version': 1,
+        'description': 'competitions.scraper_fingerprints (incremental scrape)',
+        'statements': [
+            "ALTER TABLE competitions ADD COLUMN IF NOT EXISTS scraper_fingerprints JSON",
+        ],
+    },
+    {
+        'version': 2,
+        'description': 'indexes on foreign keys and filter columns',
+        'indexes': [
+            # (name, table, columns, partial index condition)
+            ("ix_association_raceboat_athlete_athlete_id", "association_raceboat_athlete", "athlete_id", None),
+            ("ix_competition_types_competition_category_id", "competition_types", "competition_category_id", None),
+            ("ix_competitions_competition_type_id", "competitions", "competition_type_id", None),
+            ("ix_competitions_year", "competitions", "year", None),
+            ("ix_events_competition_id", "events", "competition_id", None),
+            ("ix_events_boat_class_id", "events", "boat_class_id", None),
+            ("ix_events_gender_id", "events", "gender_id", None),
+            ("ix_races_event_id", "races", "event_id", None),
+            ("ix_races_date", "races", "date", None),
+            ("ix_races_phase_type", "races", "phase_type", None),
+            ("ix_race_boats_race_id", "race_boats", "race_id", None),
+            ("ix_race_boats_country_id", "race_boats", "country_id", None),
+            ("ix_intermediate_times_distance_meter_is_outlier", "intermediate_times", "distance_meter, is_outlier", None),
+            ("ix_intermediate_times_valid_2000m", "intermediate_times", "race_boat_id, result_time_ms",
+                "distance_meter = 2000 AND is_outlier = false"),
+        ],
+    },
+    {
+        'version': 3,
+        'description': 'athletes.name_normalized with full text index (athlete search)',
+        'statements': [
+            "ALTER TABLE athletes ADD COLUMN IF NOT EXISTS name_normalized VARCHAR",
+        ],
+        'run': _backfill_athlete_names,
+        'indexes': [
+            # (name, table, columns, partial index condition, index method)
+            ("ix_athletes_name_search", "athletes", "to_tsvector('simple', name_normalized)", None, "gin"),
+        ],
+    },
+    {
+        'version': 4,
+        'description': 'athlete_summaries: race count, race dates, finals and medals',
+        'statements': [
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS nation VARCHAR",
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS race_count INTEGER",
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS first_race_date TIMESTAMP WITHOUT TIME ZONE",
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS last_race_date TIMESTAMP WITHOUT TIME ZONE",
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS best_rank INTEGER",
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS medals_gold INTEGER",
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS medals_silver INTEGER",
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS medals_bronze INTEGER",
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS final_a INTEGER",
+            "ALTER TABLE athlete_summaries ADD COLUMN IF NOT EXISTS final_b INTEGER",
+            # derived data: rebuilt with the new columns by migration 5
+            "DELETE FROM athlete_summaries",
+        ],
+    },
+    {
+        'version': 5,
+        'description': 'rebuild athlete_summaries (filled right away, not by the next postprocessing)',
+        'run': _rebuild_athlete_summaries,
+    },
+    {
+        'version': 6,
+        'description': 'build boat_class_statistics (matrix), filled right away, not by the next postprocessing',
+        'run': _build_boat_class_statistics,
+    },
+]
+
+
+def _ensure_migrations_table(connection):
+    connection.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """))
+
+
+def _acquire_lock(connection):
+    # Polling instead of a blocking pg_advisory_lock(): a waiting backend counts as running transaction,
+    # which CREATE INDEX CONCURRENTLY of the lock holder would wait for (deadlock).
+    while not connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': MIGRATIONS_LOCK_KEY}).scalar():
+        logger.info('Waiting for concurrently running migrations')
+        time.sleep(MIGRATIONS_LOCK_POLL_SECONDS)
+
+
+def _applied_versions(connection) -> set:
+    return set( connection.execute(text("SELECT version FROM schema_migrations")).scalars() )
+
+
+def _create_index_concurrently(connection, name, table, columns, where=None, using=None):
+    # an interrupted concurrent build leaves an invalid index behind, which IF NOT EXISTS would skip
+    invalid = connection.execute(text("""
+        SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid
+        WHERE pg_class.relname = :name AND NOT pg_index.indisvalid
+    """), {'name': name}).first()
+    if invalid:
+        logger.warning(f'Rebuild invalid index "{name}"')
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+
+    statement = f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}'
+    if using:
+        statement += f' USING {using}'
+    statement += f' ({columns})'
+    if where:
+        statement += f' WHERE {where}'
+    connection.execute(text(statement))
+
+
+def _apply(engine, autocommit_connection, migration):
+    version, description = migration['version'], migration['description']
+    logger.info(f'Apply migration version={version} "{description}"')
+
+    with engine.begin() as connection:
+        for statement in migration.get('statements', []):
+            connection.execute(text(statement))
+        if migration.get('run'):
+            migration['run'](connection)
+
+    for index in migration.get('indexes', []):
+        _create_index_concurrently(autocommit_connection, *index)
+
+    with engine.begin() as connection:
+        connection.execute(
+            text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+            {'version': version, 'description': description}
+        )
+
+
+def migrate(engine, migrations=MIGRATIONS) -> list:
+    """Applies all pending migrations in order. Returns the versions applied."""
+    applied_now = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        _acquire_lock(connection)
+        try:
+            _ensure_migrations_table(connection)
+            applied = _applied_versions(connection)
+            for migration in sorted(migrations, key=lambda m: m['version']):
+                if migration['version'] in applied:
+                    continue
+                _apply(engine, connection, migration)
+                applied_now.append(migration['version'])
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATIONS_LOCK_KEY})
+
+    if applied_now:
+        logger.info(f'Applied migrations {applied_now}')
+    return applied_now
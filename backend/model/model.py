@@ -2,11 +2,12 @@ import os
 import enum
 import urllib.parse
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy import Column, ForeignKey, Integer, BigInteger, Float, String, Boolean, Date, DateTime, Enum
+from sqlalchemy import Column, ForeignKey, Integer, BigInteger, Float, String, Boolean, Date, DateTime, Enum, JSON, Index
+from sqlalchemy.dialects.postgresql import ARRAY
 
 import logging
 # logging.getLogger().setLevel(logging.INFO)
@@ -62,6 +63,7 @@ class Enum_Maintenance_Level(enum.Enum):
     """Enum for Competition Entity"""
     world_rowing_api_prescraped = 25
     world_rowing_api_scraped = 50
+    world_rowing_api_postprocessed = 75
 
 class Enum_Data_Provider(enum.Enum):
     manually_entered = 1
@@ -84,7 +86,7 @@ class Association_Race_Boat_Athlete(Base):
     __tablename__ = "association_raceboat_athlete"
 
     race_boat_id = Column(ForeignKey("race_boats.id", name="fk_assoc_rbta_race_boat"), primary_key=True)
-    athlete_id = Column(ForeignKey("athletes.id", name="fk_assoc_rbta_athlete"), primary_key=True)
+    athlete_id = Column(ForeignKey("athletes.id", name="fk_assoc_rbta_athlete"), primary_key=True, index=True)
 
     # extra data fields
     boat_position = Column(String)
@@ -152,6 +154,9 @@ class Athlete(Base):
     last_name__ = Column(String) # e.g. "KRAJANGJAM"
     birthdate = Column(Date)
 
+    # search key, e.g. "nuntida krajangjam" (see common.helpers.normalize_name)
+    name_normalized = Column(String)
+
     height_cm__ = Column(Integer)
     weight_kg__ = Column(Integer)
 
@@ -165,6 +170,44 @@ class Athlete(Base):
     # relationships
     race_boats = relationship("Association_Race_Boat_Athlete", back_populates="athlete")
 
+    __table_args__ = (
+        # full text search on the normalized name, see /get_athlete_by_name
+        Index("ix_athletes_name_search", text("to_tsvector('simple', name_normalized)"), postgresql_using="gin"),
+    )
+
+
+class Athlete_Summary(Base):
+    """
+    Per-athlete facts derived from the race boats of the athlete (/get_athlete, search filters of
+    /get_athlete_by_name). Derived data: rebuilt by the postprocessing stage, see
+    postprocessing.refresh_athlete_summaries().
+    """
+    __tablename__ = "athlete_summaries"
+
+    athlete_id = Column(BigInteger, ForeignKey("athletes.id", name="fk_athlete_summary_athlete"), primary_key=True, autoincrement=False)
+    athlete    = relationship("Athlete")
+
+    nations = Column(ARRAY(String)) # country codes
+    boat_classes = Column(ARRAY(String)) # boat class uuids
+    nation = Column(String) # country code of the most recent race
+
+    race_count = Column(Integer)
+    first_race_date = Column(DateTime)
+    last_race_date = Column(DateTime)
+
+    # A final = phase "final" number 1, B final = number 2
+    best_rank = Column(Integer) # best rank in an A final
+    medals_gold = Column(Integer)
+    medals_silver = Column(Integer)
+    medals_bronze = Column(Integer)
+    final_a = Column(Integer)
+    final_b = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_athlete_summaries_nations", "nations", postgresql_using="gin"),
+        Index("ix_athlete_summaries_boat_classes", "boat_classes", postgresql_using="gin"),
+    )
+
 class Boat_Class(Base):
     __tablename__ = "boat_classes"
 
@@ -192,7 +235,7 @@ class Competition_Type(Base):
     abbreviation = Column(String)
     name = Column(String)
 
-    competition_category_id = Column(ForeignKey("competition_categories.id", name="fk_comp_type_comp_category"))
+    competition_category_id = Column(ForeignKey("competition_categories.id", name="fk_comp_type_comp_category"), index=True)
     competition_category    = relationship("Competition_Category", back_populates="competition_types")
 
     # relationships
@@ -223,14 +266,16 @@ class Competition(Base):
     scraper_maintenance_level = Column(Integer, nullable=False)
     scraper_last_scrape = Column(DateTime)
     scraper_data_provider = Column(Integer) # Use Enum_Data_Provider
+    # hashes of the API payload at the last scrape (competition, events, races); see scraper_procedures/scraping.py
+    scraper_fingerprints = Column(JSON)
 
-    competition_type_id = Column(ForeignKey("competition_types.id", name="fk_competition_comp_type"))
+    competition_type_id = Column(ForeignKey("competition_types.id", name="fk_competition_comp_type"), index=True)
     competition_type    = relationship("Competition_Type", back_populates="competitions")
     venue_id = Column(ForeignKey("venues.id", name="fk_competition_venue"))
     venue    = relationship("Venue", back_populates="competitions")
 
     name = Column(String)
-    year = Column(Integer)
+    year = Column(Integer, index=True)
     start_date = Column(DateTime)
     end_date = Column(DateTime)
 
@@ -249,11 +294,11 @@ class Event(Base):
     additional_id_ = Column(String, index=True, unique=True)
     name = Column(String)
 
-    competition_id = Column(ForeignKey("competitions.id", name="fk_event_competition"))
+    competition_id = Column(ForeignKey("competitions.id", name="fk_event_competition"), index=True)
     competition    = relationship("Competition", back_populates="events")
-    boat_class_id = Column(ForeignKey("boat_classes.id", name="fk_event_boat_class"))
+    boat_class_id = Column(ForeignKey("boat_classes.id", name="fk_event_boat_class"), index=True)
     boat_class    = relationship("Boat_Class", back_populates="events")
-    gender_id = Column(ForeignKey("genders.id", name="fk_event_gender"))
+    gender_id = Column(ForeignKey("genders.id", name="fk_event_gender"), index=True)
     gender    = relationship("Gender")
 
     rsc_code__ = Column(String) # RSC-Codes of races contain more information
@@ -267,13 +312,13 @@ class Race(Base): # https://world-rowing-api.soticcloud.net/stats/api/race/b0eae
 
     id = Column(BigInteger, primary_key=True)
     additional_id_ = Column(String, index=True, unique=True)
-    event_id = Column(ForeignKey("events.id", name="fk_race_event"))
+    event_id = Column(ForeignKey("events.id", name="fk_race_event"), index=True)
     event    = relationship("Event", back_populates="races")
 
     name = Column(String)
-    date = Column(DateTime)
+    date = Column(DateTime, index=True)
 
-    phase_type = Column(String) # e.g. "heat", "final", "semifinal"
+    phase_type = Column(String, index=True) # e.g. "heat", "final", "semifinal"
     phase_subtype = Column(String) # e.g. "SA/B/C 1" -> "A/B/C", "FB" -> NULL, "H3" -> NULL
     phase_number = Column(Integer) # e.g. "SA/B/C 1" -> 1, "FB" -> 2, "H3" -> 3
 
@@ -318,9 +363,9 @@ class Race_Boat(Base):
 
     id = Column(BigInteger, primary_key=True)
     additional_id_ = Column(String, index=True, unique=True)
-    race_id = Column(ForeignKey("races.id", name="fk_race_boat_race"))
+    race_id = Column(ForeignKey("races.id", name="fk_race_boat_race"), index=True)
     race    = relationship("Race", back_populates="race_boats")
-    country_id = Column(ForeignKey("countries.id", name="fk_race_boat_country"))
+    country_id = Column(ForeignKey("countries.id", name="fk_race_boat_country"), index=True)
     country    = relationship("Country")
 
     # many-to-many relationship
@@ -375,6 +420,14 @@ class Race_Data(Base):
 
 class Intermediate_Time(Base):
     __tablename__ = "intermediate_times"
+    __table_args__ = (
+        Index("ix_intermediate_times_distance_meter_is_outlier", "distance_meter", "is_outlier"),
+        # valid (non-outlier) 2000m results, e.g. api/race.py COND_VALID_2000M_RESULTS and /matrix
+        Index(
+            "ix_intermediate_times_valid_2000m", "race_boat_id", "result_time_ms",
+            postgresql_where=text("distance_meter = 2000 AND is_outlier = false")
+        ),
+    )
 
     # Multi Column Primary Key: https://stackoverflow.com/a/9036128
     race_boat_id = Column(ForeignKey("race_boats.id", name="fk_intermediate_time_race_boat"), primary_key=True, autoincrement=False)
@@ -398,6 +451,46 @@ class Intermediate_Time(Base):
     start_position__ = Column(String)
 
 
+class Boat_Class_Statistics(Base):
+    """
+    Pre-aggregated valid 2000m result times (no outliers, no zero times) for the /matrix endpoint.
+    One row per combination of the filter dimensions. Derived data: rebuilt by the postprocessing
+    stage, see postprocessing.refresh_boat_class_statistics().
+    """
+    __tablename__ = "boat_class_statistics"
+
+    id = Column(BigInteger, primary_key=True)
+
+    # filter dimensions
+    boat_class_id = Column(ForeignKey("boat_classes.id", name="fk_boat_class_statistics_boat_class"), nullable=False, index=True)
+    boat_class    = relationship("Boat_Class")
+    gender_id = Column(ForeignKey("genders.id", name="fk_boat_class_statistics_gender"))
+    year = Column(Integer)
+    competition_type_id = Column(ForeignKey("competition_types.id", name="fk_boat_class_statistics_competition_type"))
+    competition_type    = relationship("Competition_Type")
+    phase_type = Column(String)
+    phase_number = Column(Integer)
+    rank = Column(Integer)
+
+    # aggregates
+    result_count = Column(Integer, nullable=False) # number of intermediates
+    result_time_count = Column(Integer, nullable=False) # number of intermediates with result time (mean = sum / count)
+    result_time_sum_ms = Column(BigInteger)
+    result_time_min_ms = Column(Integer)
+
+
+
+class Data_Version(Base):
+    """
+    Single row: counter that is bumped whenever the scraper finished writing a pass (end of postprocessing).
+    API response caches are keyed by it.
+    """
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime)
+
 #----------------------------------------------------------------------
 
 
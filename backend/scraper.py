@@ -6,6 +6,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 from scraper_procedures.config import *
+from model import model, dbutils
 from scraper_procedures.prescraping import prescrape
 from scraper_procedures.scraping import scrape
 from scraper_procedures.postprocessing import postprocess
@@ -19,10 +20,16 @@ from scraper_procedures.postprocessing import postprocess
     - Operates on competition level
     - Scrape from World Rowing API (scrapping_wr/api.py) and write to db (model/dbutils.py)
     - Parse PDF Data & Merge/Assign Data to the right boat
+    - Fetching runs in a pool of SCRAPER_WORKERS workers; a single writer commits to the db
+    - PDF parsing (camelot, CPU bound) runs in a pool of SCRAPER_PDF_PROCESSES processes
+    - With SCRAPER_INCREMENTAL only races whose API data changed since the last scrape are
+      remapped & their PDFs parsed (fingerprints stored in competitions.scraper_fingerprints)
 - [POSTPROCESS] Procedure
     - Operates on the database as a whole
     - Go through the database that already has much data in it (robust basis for statistics)
     - Outlier Detection & Marking
+    - Incremental: only competitions at maintenance level "scraped" and their outlier groups are
+      processed, afterwards they are "postprocessed" (--full-rebuild processes everything)
     - World Best Times
     - Remove Inconsistencies
 """
@@ -33,12 +40,12 @@ def scheduler(duration=SCRAPER_SLEEP_TIME_SECONDS):
     logger.info(f"Waiting {duration} seconds ...")
     sleep(duration)
 
-def start_service(singlepass=False):
+def start_service(singlepass=False, full_rebuild=SCRAPER_POSTPROCESS_FULL_REBUILD):
     logger.info("[start_service]")
     while True:
         prescrape()
         scrape(parse_pdf=True)
-        postprocess()
+        postprocess(full_rebuild=full_rebuild)
 
         if SCRAPER_SINGLEPASS or singlepass:
             logger.info("Override Scheduler")
@@ -61,12 +68,18 @@ if __name__ == '__main__':
         choices=list(procedures.keys()), action="append"
     )
     parser.add_argument("-s", "--singlepass", help="Ignore the scheduler. Script exits after one pass.", action="store_true")
+    parser.add_argument("--full-rebuild", help="Postprocess all competitions, not only the (re)scraped ones.", action="store_true")
     args = parser.parse_args()
     logger.info(args)
 
+    full_rebuild = args.full_rebuild or SCRAPER_POSTPROCESS_FULL_REBUILD
+
+    # bring the schema up to date before anything else touches the db
+    dbutils.create_tables(model.engine)
+    procedures["postprocess"] = lambda: postprocess(full_rebuild=full_rebuild)
     
     if not args.procedure:
-        start_service(singlepass=args.singlepass)
+        start_service(singlepass=args.singlepass, full_rebuild=full_rebuild)
     else:
         for procedure_id in args.procedure:
             function = procedures[procedure_id]
@@ -1,5 +1,8 @@
 import logging
 
+from sqlalchemy import select, literal, or_
+from sqlalchemy.dialects.postgresql import insert
+
 from model import model
 # from model import dbutils
 from common.helpers import get_, select_first
@@ -19,8 +22,10 @@ def bubble_up_2km_intermediate(intermediate: model.Intermediate_Time):
     intermediate.race_boat.invalid_mark_result_code_id = intermediate.invalid_mark_result_code_id
     intermediate.race_boat.rank = intermediate.rank
 
-def bubble_down_2km_intermediate(session, race_boat: model.Race_Boat, force_overwrite=True, outlier_val=True, logger=logger, data_source=None):
+def bubble_down_2km_intermediate(session, race_boat: model.Race_Boat, force_overwrite=True, outlier_val=True, logger=logger, data_source=None, keep_outlier_mark=False):
     """ synchronizes Race_Boat result data to its 2km Intermediate
+    keep_outlier_mark: outlier_val only applies to a newly created Intermediate
+    Returns True if the Intermediate was created or any of its values changed.
     """
     written_something_ = False
 
@@ -34,11 +39,66 @@ def bubble_down_2km_intermediate(session, race_boat: model.Race_Boat, force_over
         intermediate.invalid_mark_result_code_id = race_boat.invalid_mark_result_code_id
         intermediate.rank = race_boat.rank
         intermediate.result_time_ms = race_boat.result_time_ms
-        intermediate.is_outlier = outlier_val
+        if create_new or not keep_outlier_mark:
+            intermediate.is_outlier = outlier_val
         if data_source != None:
             intermediate.data_source = data_source
 
     if create_new:
         session.add(intermediate)
+        return True
+
+    return written_something_ and session.is_modified(intermediate)
+
+
+def sync_2km_intermediates(session, competition_ids=None, outlier_val=True, data_source=None) -> int:
+    """ set-based bubble-down: upserts the 2km Intermediate of all race boats (or of the race boats of the given
+    competitions) from their result data in a single INSERT ... ON CONFLICT DO UPDATE statement.
+    is_outlier (outlier_val) is only set on newly inserted rows, existing rows keep their marking until
+    the outlier marking recomputes it. Only rows whose values actually change are written.
+    Returns number of rows written. No commit.
+    """
+    race_boats = select(
+        model.Race_Boat.id,
+        literal(2000),
+        model.Race_Boat.invalid_mark_result_code_id,
+        model.Race_Boat.rank,
+        model.Race_Boat.result_time_ms,
+        literal(outlier_val),
+        literal(data_source, type_=model.Intermediate_Time.data_source.type),
+    )
+    if competition_ids != None:
+        race_boats = (
+            race_boats
+            .join(model.Race_Boat.race)
+            .join(model.Race.event)
+            .where(model.Event.competition_id.in_(competition_ids))
+        )
+
+    statement = insert(model.Intermediate_Time).from_select(
+        ['race_boat_id', 'distance_meter', 'invalid_mark_result_code_id', 'rank', 'result_time_ms', 'is_outlier', 'data_source'],
+        race_boats
+    )
+    excluded = statement.excluded
+
+    set_ = {
+        'invalid_mark_result_code_id': excluded.invalid_mark_result_code_id,
+        'rank': excluded.rank,
+        'result_time_ms': excluded.result_time_ms,
+    }
+    changed = [
+        model.Intermediate_Time.invalid_mark_result_code_id.is_distinct_from(excluded.invalid_mark_result_code_id),
+        model.Intermediate_Time.rank.is_distinct_from(excluded.rank),
+        model.Intermediate_Time.result_time_ms.is_distinct_from(excluded.result_time_ms),
+    ]
+    if data_source != None:
+        set_['data_source'] = excluded.data_source
+        changed.append(model.Intermediate_Time.data_source.is_distinct_from(excluded.data_source))
 
-    return written_something_
\ No newline at end of file
+    statement = statement.on_conflict_do_update(
+        index_elements=[model.Intermediate_Time.race_boat_id, model.Intermediate_Time.distance_meter],
+        set_=set_,
+        where=or_(*changed)
+    )
+    result = session.execute(statement)
+    return result.rowcount
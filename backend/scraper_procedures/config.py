@@ -22,4 +22,16 @@ SCRAPER_DEV_MODE = os.environ.get('DRV_SCRAPER_DEV_MODE','').strip() == '1'
 SCRAPER_RESCRAPE_LIMIT_DAYS = int(os.environ.get('SCRAPER_RESCRAPE_LIMIT_DAYS', '45').strip())
 
 # Assumption on how long a competition takes
-SCRAPER_MAINTENANCE_PERIOD_DAYS = int(os.environ.get('SCRAPER_MAINTENANCE_PERIOD_DAYS', '7').strip())
\ No newline at end of file
+SCRAPER_MAINTENANCE_PERIOD_DAYS = int(os.environ.get('SCRAPER_MAINTENANCE_PERIOD_DAYS', '7').strip())
+
+# Only remap races (and reparse their PDFs) whose API data changed since the last scrape
+SCRAPER_INCREMENTAL = os.environ.get('SCRAPER_INCREMENTAL', '1').strip() == '1'
+
+# Postprocess all competitions, not only the ones (re)scraped since the last postprocessing
+SCRAPER_POSTPROCESS_FULL_REBUILD = os.environ.get('SCRAPER_POSTPROCESS_FULL_REBUILD', '').strip() == '1'
+
+# Number of workers fetching & parsing competitions concurrently (DB writes stay in a single writer)
+SCRAPER_WORKERS = max(1, int(os.environ.get('SCRAPER_WORKERS', '4').strip()))
+
+# Number of processes parsing PDFs (CPU bound). Defaults to the number of cores
+SCRAPER_PDF_PROCESSES = max(1, int(os.environ.get('SCRAPER_PDF_PROCESSES', '').strip() or os.cpu_count() or 1))
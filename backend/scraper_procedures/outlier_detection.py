@@ -1,5 +1,5 @@
 
-from sqlalchemy import select, update, or_, and_, func
+from sqlalchemy import select, update, or_, func, tuple_
 from sqlalchemy.orm.session import Session
 from model import model
 
@@ -17,12 +17,65 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("outlier_detector")
 
 
-def outlier_detection_race_data(session:Session, boat_class: model.Boat_Class) -> None:
-    logger.info(f"Marking race_data for boat class: {boat_class.id}")
-    race_data_statement = (
+def _join_criteria(race_boat_id_column) -> list:
+    """Join conditions from a race boat to its competition type, for UPDATE ... FROM statements"""
+    return [
+        race_boat_id_column == model.Race_Boat.id,
+        model.Race_Boat.race_id == model.Race.id,
+        model.Race.event_id == model.Event.id,
+        model.Event.competition_id == model.Competition.id,
+        model.Competition.competition_type_id == model.Competition_Type.id,
+    ]
+
+
+def _group_key(Entity) -> tuple:
+    """Columns identifying the group a row is compared with: (boat_class, distance_meter, competition_category)"""
+    return tuple_(model.Event.boat_class_id, Entity.distance_meter, model.Competition_Type.competition_category_id)
+
+
+def _affected_groups(Entity, competition_ids: list):
+    """Select of the groups that have rows in the given competitions"""
+    return (
+        select(model.Event.boat_class_id, Entity.distance_meter, model.Competition_Type.competition_category_id)
+        .where(
+            *_join_criteria(Entity.race_boat_id),
+            model.Competition.id.in_(competition_ids)
+        )
+        .distinct()
+        # never correlate with the (same) tables of the enclosing statement
+        .correlate(None)
+    )
+
+
+def _reset_outliers(session:Session, Entity, groups=None) -> None:
+    """Sets is_outlier=False for all rows (groups=None) or for all rows of the given groups"""
+    statement = update(Entity).values(is_outlier=False).execution_options(synchronize_session=False)
+    if groups != None:
+        statement = statement.where(*_join_criteria(Entity.race_boat_id), _group_key(Entity).in_(groups))
+    session.execute(statement)
+
+
+def outlier_detection_race_data(session:Session, competition_ids: list = None) -> None:
+    """Marks race data as outlier if speed or stroke is outside the percentiles of its
+    (boat_class, distance_meter, competition_category) group.
+    The percentiles of all groups are computed by a single grouped subquery; single UPDATE, no commit.
+    competition_ids: only reclassify the groups having rows in these competitions (None: all groups)
+    """
+    logger.info(f"Marking race_data")
+    groups = None if competition_ids == None else _affected_groups(model.Race_Data, competition_ids)
+
+    # reset to ensure that the percentile-strategy works
+    _reset_outliers(session, model.Race_Data, groups=groups)
+
+    percentiles_statement = (
         select(
+            model.Event.boat_class_id,
             model.Race_Data.distance_meter,
-            model.Competition_Category.id.label("competition_category_id")
+            model.Competition_Category.id.label("competition_category_id"),
+            func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MIN).within_group(model.Race_Data.speed_meter_per_sec.desc()).label("percentile_smps_min"),
+            func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MAX).within_group(model.Race_Data.speed_meter_per_sec.desc()).label("percentile_smps_max"),
+            func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MIN).within_group(model.Race_Data.stroke.desc()).label("percentile_stroke_min"),
+            func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MAX).within_group(model.Race_Data.stroke.desc()).label("percentile_stroke_max"),
         )
         .join(model.Race_Data.race_boat)
         .join(model.Race_Boat.race)
@@ -30,107 +83,67 @@ def outlier_detection_race_data(session:Session, boat_class: model.Boat_Class) -
         .join(model.Event.competition)
         .join(model.Competition.competition_type)
         .join(model.Competition_Type.competition_category)
-        .where(model.Event.boat_class_id == boat_class.id)
-        .order_by(model.Race_Data.distance_meter)
+        .where(model.Race_Data.speed_meter_per_sec != 0)
         .group_by(
+            model.Event.boat_class_id,
             model.Race_Data.distance_meter,
             model.Competition_Category.id
         )
     )
-    race_data = session.execute(race_data_statement).all()
-
-    for row in race_data: 
-
-        percentiles_statement = (
-            select(
-                
-                    func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MIN).within_group(model.Race_Data.speed_meter_per_sec.desc()).label("percentile_smps_min"),
-                    func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MAX).within_group(model.Race_Data.speed_meter_per_sec.desc()).label("percentile_smps_max"),
-                    func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MIN).within_group(model.Race_Data.stroke.desc()).label("percentile_stroke_min"),
-                    func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MAX).within_group(model.Race_Data.stroke.desc()).label("percentile_stroke_max"),
-                
-            )
-            .join(model.Race_Data.race_boat)
-            .join(model.Race_Boat.race)
-            .join(model.Race.event)
-            .join(model.Event.competition)
-            .join(model.Competition.competition_type)
-            .join(model.Competition_Type.competition_category)
-            .where(
-                and_(
-                    model.Event.boat_class_id == boat_class.id,
-                    model.Race_Data.distance_meter == row.distance_meter,
-                    model.Competition_Category.id == row.competition_category_id,
-                    model.Race_Data.speed_meter_per_sec != 0
-                )
-            )
-        )
-
-        percentiles = session.execute(percentiles_statement).fetchall()[0]
-
-        if not all(percentiles): 
-            # if there is a None in percentiles, it means they could not have been calculated. 
-            # This is a result from no data present to calc the percentiles.
-            logger.info(
-                f"""Could not calculate the percentiles. The folloing filters result in no data:
-                    - Event.boat_class_id: {boat_class.id}
-                    - Race_Data.distance_meter: {row.distance_meter}
-                    - Event.competition_category: {row.competition_category_id}
-                moving on to next distance_meter."""
-            )
-            continue
-        else: 
-            min_smps, max_smps, min_stroke, max_stroke = sorted(percentiles)
-
-        to_adjust_statement = (
-            select(
-                model.Race_Data.race_boat_id,
-                model.Race_Data.distance_meter
-            )
-            .join(model.Race_Data.race_boat)
-            .join(model.Race_Boat.race)
-            .join(model.Race.event)
-            .join(model.Event.competition)
-            .join(model.Competition.competition_type)
-            .join(model.Competition_Type.competition_category)
-            .where(
-                and_(
-                    model.Event.boat_class_id == boat_class.id,
-                    or_(
-                        ~model.Race_Data.speed_meter_per_sec.between(min_smps, max_smps),
-                        ~model.Race_Data.stroke.between(min_stroke, max_stroke),
-                    ),
-                    model.Race_Data.distance_meter == row.distance_meter,
-                    model.Competition_Category.id == row.competition_category_id
-                )
+    if groups != None:
+        percentiles_statement = percentiles_statement.where(_group_key(model.Race_Data).in_(groups))
+    percentiles = percentiles_statement.subquery()
+    # percentiles are computed in descending order -> bounds via least/greatest
+    min_smps = func.least(percentiles.c.percentile_smps_min, percentiles.c.percentile_smps_max)
+    max_smps = func.greatest(percentiles.c.percentile_smps_min, percentiles.c.percentile_smps_max)
+    min_stroke = func.least(percentiles.c.percentile_stroke_min, percentiles.c.percentile_stroke_max)
+    max_stroke = func.greatest(percentiles.c.percentile_stroke_min, percentiles.c.percentile_stroke_max)
+
+    statement = (
+        update(model.Race_Data)
+        .where(
+            *_join_criteria(model.Race_Data.race_boat_id),
+            model.Event.boat_class_id == percentiles.c.boat_class_id,
+            model.Race_Data.distance_meter == percentiles.c.distance_meter,
+            model.Competition_Type.competition_category_id == percentiles.c.competition_category_id,
+            # groups without (non-zero) percentiles could not be calculated -> not marked
+            percentiles.c.percentile_smps_min != 0,
+            percentiles.c.percentile_smps_max != 0,
+            percentiles.c.percentile_stroke_min != 0,
+            percentiles.c.percentile_stroke_max != 0,
+            or_(
+                ~model.Race_Data.speed_meter_per_sec.between(min_smps, max_smps),
+                ~model.Race_Data.stroke.between(min_stroke, max_stroke),
             )
         )
-
-        to_adjust = session.execute(to_adjust_statement).fetchall()
-        # todo: how to do a bulk-update? 
-        for race_boat_id, distance_meter in to_adjust: 
-            updt = update(model.Race_Data)
-            updt = updt.values({'is_outlier': True})
-            updt = updt.where(model.Race_Data.race_boat_id == race_boat_id)
-            updt = updt.where(model.Race_Data.distance_meter == distance_meter)
-
-            session.execute(updt)
-            session.commit()
-
-    return None
-
+        .values(is_outlier=True)
+        .execution_options(synchronize_session=False)
+    )
+    result = session.execute(statement)
+    logger.info(f"Marked race_data count={result.rowcount}")
 
 
-def outlier_detection_result_data(session:Session, boat_class: model.Boat_Class) -> None:
+def outlier_detection_result_data(session:Session, competition_ids: list = None) -> None:
+    """Marks intermediates as outlier if the result time is outside the percentiles of its
+    (boat_class, distance_meter, competition_category) group.
+    The percentiles of all groups are computed by a single grouped subquery; single UPDATE, no commit.
+    competition_ids: only reclassify the groups having rows in these competitions (None: all groups)
+    """
+    logger.info(f"Marking result_data")
+    groups = None if competition_ids == None else _affected_groups(model.Intermediate_Time, competition_ids)
 
-    logger.info(f"Marking result_data for boat class: {boat_class.id}")
+    # reset to ensure that the percentile-strategy works
+    _reset_outliers(session, model.Intermediate_Time, groups=groups)
 
     # https://docs.sqlalchemy.org/en/14/core/selectable.html#sqlalchemy.sql.expression.GenerativeSelect.group_by
     # func.xxx ---> https://www.postgresql.org/docs/8.2/functions-aggregate.html
-    intermediate_statement = (
+    percentiles_statement = (
         select(
+            model.Event.boat_class_id,
             model.Intermediate_Time.distance_meter,
-            model.Competition_Category.id.label('competition_category_id')
+            model.Competition_Category.id.label("competition_category_id"),
+            func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MIN).within_group(model.Intermediate_Time.result_time_ms.desc()).label("percentile_min"),
+            func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MAX).within_group(model.Intermediate_Time.result_time_ms.desc()).label("percentile_max"),
         )
         .join(model.Intermediate_Time.race_boat)
         .join(model.Race_Boat.race)
@@ -138,103 +151,30 @@ def outlier_detection_result_data(session:Session, boat_class: model.Boat_Class)
         .join(model.Event.competition)
         .join(model.Competition.competition_type)
         .join(model.Competition_Type.competition_category)
-        .where(model.Event.boat_class_id == boat_class.id)
-        .order_by(model.Intermediate_Time.distance_meter)
+        .where(model.Intermediate_Time.result_time_ms != 0)
         .group_by(
+            model.Event.boat_class_id,
             model.Intermediate_Time.distance_meter,
             model.Competition_Category.id
         )
     )
-
-    wbt_statement = (
-        select(
-            model.Boat_Class.id, 
-            model.Race_Boat.result_time_ms
+    if groups != None:
+        percentiles_statement = percentiles_statement.where(_group_key(model.Intermediate_Time).in_(groups))
+    percentiles = percentiles_statement.subquery()
+    _min = func.least(percentiles.c.percentile_min, percentiles.c.percentile_max)
+    _max = func.greatest(percentiles.c.percentile_min, percentiles.c.percentile_max)
+
+    statement = (
+        update(model.Intermediate_Time)
+        .where(
+            *_join_criteria(model.Intermediate_Time.race_boat_id),
+            model.Event.boat_class_id == percentiles.c.boat_class_id,
+            model.Intermediate_Time.distance_meter == percentiles.c.distance_meter,
+            model.Competition_Type.competition_category_id == percentiles.c.competition_category_id,
+            ~model.Intermediate_Time.result_time_ms.between(_min, _max)
         )
-        .join(model.Race_Boat)
+        .values(is_outlier=True)
+        .execution_options(synchronize_session=False)
     )
-
-    intermediates = session.execute(intermediate_statement).all()
-
-    if len(intermediates) == 0: 
-        logger.info(f"Skipping boat class: {boat_class.id}. No intermediates with this boatclass")
-        return None
-
-    wbts = session.execute(wbt_statement).all()
-    wbt = [wb[1] for wb in wbts if wb[0] == boat_class.id]
-    wbt = wbt[0] if len(wbt) > 0 else 0
-    longest_distance = intermediates[-1].distance_meter
-
-    for row in tqdm(intermediates):
-
-        logger.debug(f"  Competition Category: {row.competition_category_id}")
-
-        percentiles_statement = (
-            select(
-                [
-                    func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MIN).within_group(model.Intermediate_Time.result_time_ms.desc()),
-                    func.percentile_cont(OUTLIER_DETECTION_PERCENTILE_MAX).within_group(model.Intermediate_Time.result_time_ms.desc()),
-                ],
-            )
-            .join(model.Intermediate_Time.race_boat)
-            .join(model.Race_Boat.race)
-            .join(model.Race.event)
-            .join(model.Event.competition)
-            .join(model.Competition.competition_type)
-            .join(model.Competition_Type.competition_category)
-            .where(
-                and_(
-                    model.Event.boat_class_id == boat_class.id,
-                    model.Intermediate_Time.distance_meter == row.distance_meter,
-                    model.Competition_Category.id == row.competition_category_id,
-                    model.Intermediate_Time.result_time_ms != 0
-                )
-            )
-        )
-
-        percentiles = sorted(session.execute(percentiles_statement).fetchall()[0])
-        if (row.distance_meter < longest_distance and wbt != 0): 
-            """
-                todo: this could be done better, 
-                    by checking for which distance_meter the wbt was originally achieved
-            """
-            _min = wbt
-            logging.debug("Use WBT for min")
-        else: 
-            _min = percentiles[0]
-        _min = percentiles[0]
-        _max = percentiles[1]
-
-        to_adjust_statement = (
-            select(
-                model.Intermediate_Time.race_boat_id,
-                model.Intermediate_Time.distance_meter
-            )
-            .join(model.Intermediate_Time.race_boat)
-            .join(model.Race_Boat.race)
-            .join(model.Race.event)
-            .join(model.Event.competition)
-            .join(model.Competition.competition_type)
-            .join(model.Competition_Type.competition_category)
-            .where(
-                and_(
-                    model.Event.boat_class_id == boat_class.id,
-                    ~model.Intermediate_Time.result_time_ms.between(_min, _max),
-                    model.Intermediate_Time.distance_meter == row.distance_meter,
-                    model.Competition_Category.id == row.competition_category_id
-                )
-            )
-        )
-
-        to_adjust = session.execute(to_adjust_statement).fetchall()
-        # todo: how to do a bulk-update? 
-        for intermediate_id, distance_meter in to_adjust: 
-            updt = update(model.Intermediate_Time)
-            updt = updt.values({'is_outlier': True})
-            updt = updt.where(model.Intermediate_Time.race_boat_id == intermediate_id)
-            updt = updt.where(model.Intermediate_Time.distance_meter == distance_meter)
-
-            session.execute(updt)
-            session.commit()
-
-    return None
+    result = session.execute(statement)
+    logger.info(f"Marked intermediates count={result.rowcount}")
@@ -1,17 +1,19 @@
 import logging
 from contextlib import suppress
-from itertools import count
 
-from sqlalchemy import select, update
+from sqlalchemy import select, update, delete, insert, and_, String
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
 from sqlalchemy.sql.expression import func
 from sqlalchemy.orm import joinedload
 
-from .common import bubble_up_2km_intermediate, bubble_down_2km_intermediate
+from .config import SCRAPER_POSTPROCESS_FULL_REBUILD
+from .common import bubble_up_2km_intermediate, bubble_down_2km_intermediate, sync_2km_intermediates
 from model import model
 from model import dbutils
 from scraping_wr import api
+from scraping_wr import api_async
 from scraper_procedures import outlier_detection
-from common.helpers import Timedelta_Parser, get_, true_every_nth
+from common.helpers import Timedelta_Parser, get_
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("postprocessing")
@@ -25,7 +27,9 @@ def _wr_select_boat_class(boat_classes_dict, search_str):
     return result
 
 def refresh_world_best_times(session):
-    wbts = api.get_world_best_times()
+    LEVEL_SCRAPED = model.Enum_Maintenance_Level.world_rowing_api_scraped.value
+
+    wbts = api_async.run(api_async.get_world_best_times)
     boat_classes = api.get_boatclasses()
     for wbt in wbts:
         boat_class_abbr = wbt.get('boat_class','')
@@ -60,20 +64,27 @@ def refresh_world_best_times(session):
             logger.warning(f'Race Boat "{race_boat_uuid}" not found in db. Create entity')
             race_boat = model.Race_Boat(additional_id_=race_boat_uuid)
 
-        if not race_boat.result_time_ms == result_time_ms:
+        result_changed = not race_boat.result_time_ms == result_time_ms
+        if result_changed:
             logger.warning(f'''Result time does not match race_boat has "{race_boat.result_time_ms}" wbt says "{result_time_ms}"''')
         
         logger.info(f'Overwrite result time')
         race_boat.result_time_ms = result_time_ms
         race_boat.invalid_mark_result_code_id = None
 
-        bubble_down_2km_intermediate(
+        # is_outlier of an existing 2km intermediate is left to the outlier marking
+        written = bubble_down_2km_intermediate(
             session=session,
             race_boat=race_boat,
             data_source=model.Enum_Data_Source.world_rowing_api.value,
             force_overwrite=True,
-            outlier_val=False
+            outlier_val=False,
+            keep_outlier_mark=True
         )
+        if (result_changed or written) and race_boat.race:
+            # outlier groups of this competition have to be reclassified
+            competition = race_boat.race.event.competition
+            competition.scraper_maintenance_level = min(competition.scraper_maintenance_level, LEVEL_SCRAPED)
 
         boat_class.world_best_race_boat = race_boat
 
@@ -82,49 +93,195 @@ def refresh_world_best_times(session):
     session.commit()
 
 
-def mark_outliers(session):
-    # todo: add me to the actual postprocessing
-    with model.Scoped_Session() as session:
-        statement = select(model.Boat_Class).order_by(model.Boat_Class.id)
-        iterator = session.execute(statement).scalars()
+def mark_outliers(session, competition_ids=None):
+    """Resets and recomputes is_outlier of intermediates and race data in a single transaction.
+    competition_ids: only reclassify the groups affected by these competitions (None: everything)
+    """
+    outlier_detection.outlier_detection_result_data(session=session, competition_ids=competition_ids)
+    outlier_detection.outlier_detection_race_data(session=session, competition_ids=competition_ids)
+
+    session.commit()
+
+def refresh_boat_class_statistics(session, boat_class_ids=None) -> int:
+    """Rebuilds the pre-aggregated 2000m result times (model.Boat_Class_Statistics) of all boat classes
+    (or of the given ones) with a single DELETE + INSERT ... SELECT. Returns number of rows written. No commit.
+    """
+    Stats = model.Boat_Class_Statistics
+    dimensions = (
+        model.Event.boat_class_id,
+        model.Event.gender_id,
+        model.Competition.year,
+        model.Competition.competition_type_id,
+        model.Race.phase_type,
+        model.Race.phase_number,
+        model.Race_Boat.rank,
+    )
+    aggregates = (
+        select(
+            *dimensions,
+            func.count(model.Intermediate_Time.race_boat_id),
+            func.count(model.Intermediate_Time.result_time_ms),
+            func.sum(model.Intermediate_Time.result_time_ms),
+            func.min(model.Intermediate_Time.result_time_ms),
+        )
+        .join(model.Intermediate_Time.race_boat)
+        .join(model.Race_Boat.race)
+        .join(model.Race.event)
+        .join(model.Event.competition)
+        .join(model.Competition.competition_type)
+        .join(model.Competition_Type.competition_category)
+        .where(
+            model.Intermediate_Time.distance_meter == 2000,
+            model.Intermediate_Time.is_outlier == False,
+            model.Intermediate_Time.result_time_ms != 0
+        )
+        .group_by(*dimensions)
+    )
+
+    delete_statement = delete(Stats)
+    if boat_class_ids != None:
+        aggregates = aggregates.where(model.Event.boat_class_id.in_(boat_class_ids))
+        delete_statement = delete_statement.where(Stats.boat_class_id.in_(boat_class_ids))
+
+    session.execute(delete_statement.execution_options(synchronize_session=False))
+    statement = insert(Stats).from_select(
+        ['boat_class_id', 'gender_id', 'year', 'competition_type_id', 'phase_type', 'phase_number', 'rank',
+         'result_count', 'result_time_count', 'result_time_sum_ms', 'result_time_min_ms'],
+        aggregates
+    )
+    return session.execute(statement).rowcount
+
+def _athletes_of_competitions(competition_ids):
+    return (
+        select(model.Association_Race_Boat_Athlete.athlete_id)
+        .join(model.Association_Race_Boat_Athlete.race_boat)
+        .join(model.Race_Boat.race)
+        .join(model.Race.event)
+        .where(model.Event.competition_id.in_(competition_ids))
+    )
+
+def refresh_athlete_summaries(session, competition_ids=None) -> int:
+    """Rebuilds the summaries (model.Athlete_Summary) of all athletes (or of the athletes that raced in the
+    given competitions) with a single DELETE + INSERT ... SELECT. Returns number of rows written. No commit.
+    """
+    Summary = model.Athlete_Summary
+    Association = model.Association_Race_Boat_Athlete
 
-        # set all is_outlier to False to ensure that the percentile-strategy works
-        session.execute( update(model.Intermediate_Time).values(is_outlier=False) )
-        session.execute( update(model.Race_Data).values(is_outlier=False) )
+    is_final = model.Race.phase_type == 'final'
+    is_final_a = and_(is_final, model.Race.phase_number == 1)
+    nations_by_recency = func.array_agg(
+        aggregate_order_by(model.Country.country_code, model.Race.date.desc().nullslast(), model.Race_Boat.id)
+    )
+    columns = {
+        'athlete_id': Association.athlete_id,
+        'nations': func.array_agg(model.Country.country_code.distinct()).filter(model.Country.country_code != None),
+        'boat_classes': func.array_agg(model.Boat_Class.additional_id_.distinct()).filter(model.Boat_Class.additional_id_ != None),
+        'nation': func.array_remove(nations_by_recency, None, type_=ARRAY(String))[1],
+        'race_count': func.count(Association.race_boat_id),
+        'first_race_date': func.min(model.Race.date),
+        'last_race_date': func.max(model.Race.date),
+        'best_rank': func.min(model.Race_Boat.rank).filter(is_final_a),
+        'medals_gold': func.count().filter(and_(is_final_a, model.Race_Boat.rank == 1)),
+        'medals_silver': func.count().filter(and_(is_final_a, model.Race_Boat.rank == 2)),
+        'medals_bronze': func.count().filter(and_(is_final_a, model.Race_Boat.rank == 3)),
+        'final_a': func.count().filter(is_final_a),
+        'final_b': func.count().filter(and_(is_final, model.Race.phase_number == 2)),
+    }
+    summaries = (
+        select(*columns.values())
+        .join(Association.race_boat)
+        .join(model.Race_Boat.race)
+        .join(model.Race.event)
+        .outerjoin(model.Race_Boat.country)
+        .outerjoin(model.Event.boat_class)
+        .group_by(Association.athlete_id)
+    )
 
-        for boat_class in iterator:
-            outlier_detection.outlier_detection_result_data(session=session, boat_class=boat_class)
-            outlier_detection.outlier_detection_race_data(session=session, boat_class=boat_class)
+    delete_statement = delete(Summary)
+    if competition_ids != None:
+        athlete_ids = _athletes_of_competitions(competition_ids)
+        summaries = summaries.where(Association.athlete_id.in_(athlete_ids))
+        delete_statement = delete_statement.where(Summary.athlete_id.in_(athlete_ids))
 
-            # Low Prio TODO: session.commit() should ideally be executed here
+    session.execute(delete_statement.execution_options(synchronize_session=False))
+    statement = insert(Summary).from_select(list(columns.keys()), summaries)
+    return session.execute(statement).rowcount
 
-def bubble_down_2km_intermediate_(session, force_overwrite=True, outlier_val=True):
-    statement = (
-        select(model.Race_Boat)
-        # .options( joinedload(model.Race_Boat.intermediates) )
+def _get_boat_classes_of_competitions(session, competition_ids) -> list:
+    statement = select(model.Event.boat_class_id).distinct().where(
+        model.Event.competition_id.in_(competition_ids),
+        model.Event.boat_class_id != None
     )
-    iterator = session.execute(statement).scalars()
-    entities_written = 0
-    for race_boat, n, print_log in zip(iterator, count(), true_every_nth(1500)):
-        written = bubble_down_2km_intermediate(session=session, race_boat=race_boat, force_overwrite=force_overwrite, outlier_val=outlier_val)
-        if written:
-            entities_written += 1
+    return session.execute(statement).scalars().all()
+
+def _get_competitions_to_postprocess(session) -> list:
+    """Ids of the competitions (re)scraped since the last postprocessing"""
+    LEVEL_SCRAPED = model.Enum_Maintenance_Level.world_rowing_api_scraped.value
+    statement = select(model.Competition.id).where(model.Competition.scraper_maintenance_level == LEVEL_SCRAPED)
+    return session.execute(statement).scalars().all()
+
+def _postprocess(session, full_rebuild):
+    LEVEL_SCRAPED = model.Enum_Maintenance_Level.world_rowing_api_scraped.value
+    LEVEL_POSTPROCESSED = model.Enum_Maintenance_Level.world_rowing_api_postprocessed.value
 
-        if print_log:
-            logger.info(f'... visited so far: {n}')
+    logger.info(f"Fetch & write world best times. Also syncs to 2km intermediate")
+    refresh_world_best_times(session=session)
+
+    competition_ids = None
+    if not full_rebuild:
+        competition_ids = _get_competitions_to_postprocess(session)
+        logger.info(f"Incremental postprocessing of competitions N={len(competition_ids)}")
+
+    # derived tables, e.g. empty after a deployment -> build once from scratch
+    statistics_missing = session.execute(select(model.Boat_Class_Statistics.id).limit(1)).first() == None
+    athlete_summaries_missing = session.execute(select(model.Athlete_Summary.athlete_id).limit(1)).first() == None
+
+    if competition_ids == []:
+        if statistics_missing:
+            logger.info("Build boat class statistics")
+            refresh_boat_class_statistics(session=session)
+        if athlete_summaries_missing:
+            logger.info("Build athlete summaries")
+            refresh_athlete_summaries(session=session)
+        session.commit()
+        return
 
+    logger.info(f"Bubble-down precedure (synchronize/create 2km intermediate)")
+    written = sync_2km_intermediates(session=session, competition_ids=competition_ids, outlier_val=True)
     session.commit()
-    logger.info(f"Bubbled down count={entities_written}")
+    logger.info(f"Bubbled down count={written}")
 
-def postprocess():
-    with model.Scoped_Session() as session:
-        logger.info(f"Bubble-down precedure (synchronize/create 2km intermediate)")
-        bubble_down_2km_intermediate_(session=session, force_overwrite=True, outlier_val=True)
+    logger.info("Outlier Marking")
+    mark_outliers(session=session, competition_ids=competition_ids)
 
-        logger.info(f"Fetch & write world best times. Also syncs to 2km intermediate")
-        refresh_world_best_times(session=session)
+    # the outlier groups are per boat class: other boat classes are unaffected
+    boat_class_ids = None
+    if competition_ids != None and not statistics_missing:
+        boat_class_ids = _get_boat_classes_of_competitions(session, competition_ids)
+    logger.info(f"Refresh boat class statistics")
+    written = refresh_boat_class_statistics(session=session, boat_class_ids=boat_class_ids)
+    logger.info(f"Boat class statistics rows={written}")
 
-        logger.info("Outlier Marking")
-        mark_outliers(session=session)
-        
+    logger.info(f"Refresh athlete summaries")
+    written = refresh_athlete_summaries(session=session, competition_ids=None if athlete_summaries_missing else competition_ids)
+    logger.info(f"Athlete summaries rows={written}")
+
+    statement = update(model.Competition).values(scraper_maintenance_level=LEVEL_POSTPROCESSED)
+    if competition_ids == None:
+        statement = statement.where(model.Competition.scraper_maintenance_level >= LEVEL_SCRAPED)
+    else:
+        statement = statement.where(model.Competition.id.in_(competition_ids))
+    session.execute(statement.execution_options(synchronize_session=False))
+    session.commit()
+
+def postprocess(full_rebuild=SCRAPER_POSTPROCESS_FULL_REBUILD):
+    """By default only the competitions (re)scraped since the last run are processed, along with the
+    outlier groups they belong to. full_rebuild: process the whole database.
+    """
+    with model.Scoped_Session() as session:
+        _postprocess(session=session, full_rebuild=full_rebuild)
+
+        # invalidates the response caches of the API
+        version = dbutils.bump_data_version(session)
         session.commit()
+        logger.info(f"Data version={version}")
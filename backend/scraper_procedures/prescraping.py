@@ -6,7 +6,7 @@ from sqlalchemy import select
 from .config import *
 from model import model
 from model import dbutils
-from scraping_wr import api
+from scraping_wr import api_async
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -43,9 +43,9 @@ def _scrape_competition_heads(session, year_min, year_max, logger=logger):
         raise Exception(f"Year range is invalid: {year_min}-{year_max}")
     
     logger.info("Fetch all competition heads and write to db")
-    for year in range(year_min, year_max+1):
+    heads_by_year = api_async.run(api_async.get_competition_heads, list(range(year_min, year_max+1)))
+    for year, competitions_wr in heads_by_year.items():
         logger.info(f"Begin year={year} ---------------")
-        competitions_wr = api.get_competition_heads([year], single_fetch=False)
         for competition_data in competitions_wr:
             logger.info(f'''Adding year={year} competition="{competition_data.get('id')}" name="{competition_data.get('DisplayName')}"''')
             dbutils.wr_insert(
@@ -1,6 +1,10 @@
 import logging
 import datetime
+import hashlib
+import json
 from contextlib import suppress
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 tqdm = lambda x: x
 # from tqdm import tqdm
@@ -79,12 +83,15 @@ def _date_of_competition(comp: model.Competition) -> datetime.date:
     return comp.end_date.date() or comp.start_date.date() or year
 
 
-def _parse_and_inject_pdf_race_data(session, race: model.Race):
-    url = race.pdf_url_race_data
+def _parse_pdf_race_data(url):
     logger.info(f'pdf_racedata:Fetch & parse PDF race data url="{url}"')
     pdf_race_data_, _ = pdf_race_data.extract_data_from_pdf_url([url])
+    return pdf_race_data_
+
+
+def _inject_pdf_race_data(session, race: model.Race, pdf_race_data_: dict):
     if not pdf_race_data_:
-        logger.info(f'pdf_racedata:Failed to parse (or fetch)')
+        logger.info(f'pdf_racedata:Failed to parse (or fetch) url="{race.pdf_url_race_data}"')
         return
     matched_log_list_ = []
 
@@ -210,12 +217,15 @@ def _create_intermediates_table(pdf_results_):
     return table
 
 
-def _parse_and_inject_pdf_intermediates(session, race: model.Race):
-    url = race.pdf_url_results
+def _parse_pdf_intermediates(url):
     logger.info(f'pdf_results:Fetch & parse PDF results url="{url}"')
     pdf_parser_result__, _ = pdf_result.extract_data_from_pdf_urls([url])
+    return pdf_parser_result__
+
+
+def _inject_pdf_intermediates(session, race: model.Race, pdf_parser_result__: dict):
     if not pdf_parser_result__:
-        logger.info(f'pdf_results:Failed to parse (or fetch)')
+        logger.info(f'pdf_results:Failed to parse (or fetch) url="{race.pdf_url_results}"')
         return
     
     pdf_results_ = get_(pdf_parser_result__, 'data', [])
@@ -257,66 +267,258 @@ def _parse_and_inject_pdf_intermediates(session, race: model.Race):
     
 
 
-def _scrape_competition(session, competition: model.Competition, parse_pdf_race_data=True, parse_pdf_intermediates=True):
-    uuid = competition.additional_id_
-    assert not uuid == None
+def _iter_races_data(competition_data: dict):
+    for event_data in get_(competition_data, 'events', []):
+        for race_data in get_(event_data, 'races', []):
+            yield race_data
+
+
+def _fingerprint(data) -> str:
+    """Hash of a JSON (sub-)document, independent of the order of keys"""
+    serialized = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def _fingerprint_competition(competition_data: dict, parse_pdf: bool) -> dict:
+    """Returns the fingerprints of the competition (without events), its events (without races) and its races"""
+    fingerprints = {
+        'parse_pdf': parse_pdf,
+        'competition': _fingerprint({ k: v for k, v in competition_data.items() if k != 'events' }),
+        'events': {},
+        'races': {},
+    }
+    for event_data in get_(competition_data, 'events', []):
+        event_uuid = get_(event_data, 'id', '').lower()
+        fingerprints['events'][event_uuid] = _fingerprint({ k: v for k, v in event_data.items() if k != 'races' })
+        for race_data in get_(event_data, 'races', []):
+            race_uuid = get_(race_data, 'id', '').lower()
+            fingerprints['races'][race_uuid] = _fingerprint(race_data)
+    return fingerprints
+
+
+def _prune_unchanged(competition_data: dict, fingerprints: dict, stored_fingerprints: dict):
+    """Returns a copy of competition_data that only holds the events and races that changed
+    w.r.t. stored_fingerprints. Returns None if nothing changed at all, the whole competition_data if
+    the parse_pdf setting changed.
+    """
+    if fingerprints == stored_fingerprints:
+        return None
+
+    # PDF parsing switched on/off: the races have to be written again
+    if get_(stored_fingerprints, 'parse_pdf') != fingerprints['parse_pdf']:
+        return competition_data
+
+    stored_events = get_(stored_fingerprints, 'events', {})
+    stored_races = get_(stored_fingerprints, 'races', {})
 
-    logger.info(f'''Fetching competition="{uuid}" year="{competition.year}" name="{competition.name}"''')
+    events_data = []
+    for event_data in get_(competition_data, 'events', []):
+        event_uuid = get_(event_data, 'id', '').lower()
+        races_data = [
+            race_data for race_data in get_(event_data, 'races', [])
+            if stored_races.get(get_(race_data, 'id', '').lower()) != fingerprints['races'].get(get_(race_data, 'id', '').lower())
+        ]
+        if races_data or stored_events.get(event_uuid) != fingerprints['events'][event_uuid]:
+            events_data.append({ **event_data, 'races': races_data })
+
+    return { **competition_data, 'events': events_data }
+
+
+def _parse_pdfs(pdf_executor, competition_data: dict, parse_pdf_race_data=True, parse_pdf_intermediates=True) -> dict:
+    """Sends all PDFs of a competition to the process pool and collects the parsed dicts.
+    Returns dict[race_uuid] containing the parser results for 'results' and/or 'race_data'.
+    """
+    PARSERS = {
+        'results': (parse_pdf_intermediates, 'results', _parse_pdf_intermediates),
+        'race_data': (parse_pdf_race_data, 'race data', _parse_pdf_race_data),
+    }
+
+    futures = {}
+    for race_data in _iter_races_data(competition_data):
+        race_uuid = get_(race_data, 'id', '').lower()
+        pdf_urls = get_(race_data, 'pdfUrls', [])
+        for kind, (enabled, pdf_title, parse_func) in PARSERS.items():
+            url = get_(api.select_pdf_(pdf_urls, pdf_title), 'url')
+            if enabled and url:
+                futures[(race_uuid, kind)] = (url, pdf_executor.submit(parse_func, url))
+
+    pdf_data = {}
+    for (race_uuid, kind), (url, future) in futures.items():
+        parsed = None
+        try:
+            parsed = future.result()
+        except Exception as error:
+            logger.error(f'Parsing PDF failed url="{url}"')
+            logger.error(str(error))
+        pdf_data.setdefault(race_uuid, {})[kind] = parsed
+
+    return pdf_data
+
+
+def _fetch_competition(uuid: str, pdf_executor, parse_pdf_race_data=True, parse_pdf_intermediates=True,
+                       stored_fingerprints=None, incremental=SCRAPER_INCREMENTAL) -> dict:
+    """Worker stage: fetches the competition from the World Rowing API and has the PDFs of its races parsed.
+    Does not touch the database. Returns dict containing the API data, the parsed PDFs per race uuid and
+    the fingerprints to be stored. In incremental mode the API data only holds what changed since the
+    last scrape (None: nothing changed).
+    """
+    logger.info(f'Fetching competition="{uuid}"')
     competition_data = api.get_by_competition_id_(comp_ids=[uuid], parse_pdf=False)
 
-    logger.info(f"Write competition to database")
+    fingerprints = None
+    if competition_data:
+        parse_pdf = parse_pdf_race_data or parse_pdf_intermediates
+        fingerprints = _fingerprint_competition(competition_data, parse_pdf=parse_pdf)
+        if incremental and stored_fingerprints:
+            competition_data = _prune_unchanged(competition_data, fingerprints, stored_fingerprints)
+            if competition_data == None:
+                logger.info(f'Competition="{uuid}" unchanged since last scrape')
+                return {"competition_data": None, "pdf_data": {}, "fingerprints": stored_fingerprints}
+
+    pdf_data = {}
+    if parse_pdf_intermediates or parse_pdf_race_data:
+        pdf_data = _parse_pdfs(
+            pdf_executor,
+            competition_data,
+            parse_pdf_race_data=parse_pdf_race_data,
+            parse_pdf_intermediates=parse_pdf_intermediates
+        )
+
+    # races with failed PDFs are not fingerprinted, so they are tried again next time
+    if fingerprints:
+        for race_uuid, parsed in pdf_data.items():
+            if not all(parsed.values()):
+                fingerprints['races'].pop(race_uuid, None)
+
+    return {"competition_data": competition_data, "pdf_data": pdf_data, "fingerprints": fingerprints}
+
+
+def _write_competition(session, competition: model.Competition, fetched: dict) -> bool:
+    """Writer stage: maps the fetched competition to the database and injects the parsed PDF data.
+    Returns False if there was nothing to write (unchanged since last scrape).
+    """
+    if fetched['competition_data'] == None:
+        logger.info(f'''Skip unchanged competition="{competition.additional_id_}"''')
+        return False
+
+    logger.info(f'''Write competition="{competition.additional_id_}" year="{competition.year}" name="{competition.name}"''')
     # let's use the mapper func directly since we already have the ORM instance
-    competition = dbutils.wr_map_competition_scrape(session, competition, competition_data)
+    with dbutils.uuid_cache(session, fetched['competition_data']):
+        competition = dbutils.wr_map_competition_scrape(session, competition, fetched['competition_data'])
+    # committed data has to be postprocessed, even if the PDF injection below fails
+    competition.scraper_maintenance_level = model.Enum_Maintenance_Level.world_rowing_api_scraped.value
     session.commit() # TODO: consider removing multiple commits
 
+    pdf_data = fetched['pdf_data']
     for event in competition.events:
         race: model.Race
         for race in event.races:
-            if parse_pdf_intermediates or parse_pdf_race_data:
-                logger.info(f'Begin PDF injection for race="{race.additional_id_}"')
-            if parse_pdf_intermediates:
-                _parse_and_inject_pdf_intermediates(session=session, race=race)
-            if parse_pdf_race_data:
-                _parse_and_inject_pdf_race_data(session=session, race=race)
+            parsed = pdf_data.get(race.additional_id_)
+            if not parsed:
+                continue
+            logger.info(f'Begin PDF injection for race="{race.additional_id_}"')
+            if 'results' in parsed:
+                _inject_pdf_intermediates(session=session, race=race, pdf_parser_result__=parsed['results'])
+            if 'race_data' in parsed:
+                _inject_pdf_race_data(session=session, race=race, pdf_race_data_=parsed['race_data'])
+
+    # stored only once everything is written: after a failure the next scrape retries the changed races
+    competition.scraper_fingerprints = fetched['fingerprints']
     session.commit()
+    return True
+
+
+def _submit_bounded(executor, func, items, max_pending):
+    """Submits func(item) for every item while keeping at most max_pending futures in flight.
+    Items are pulled lazily. Yields tuples (item, future) in order of completion.
+    """
+    items = iter(items)
+    pending = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < max_pending:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+            else:
+                pending[executor.submit(func, item)] = item
+
+        if not pending:
+            return
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future
+
+
+def _competitions_due(competitions):
+    """Yields the competitions that have to be (re)scraped"""
+    LEVEL_SCRAPED = model.Enum_Maintenance_Level.world_rowing_api_scraped.value
+
+    competition: model.Competition
+    for competition in tqdm(competitions):
+        competition_uuid = competition.additional_id_
+        logger.info(f'Competition uuid="{competition_uuid}"')
+        if not competition_uuid:
+            logger.error(f"Competition with id={competition.id} has no UUID (w.r.t. World Rowing API); Skip")
+            continue
+
+        scrape = True
+        if competition.scraper_maintenance_level >= LEVEL_SCRAPED:
+            scrape = _competition_within_rescrape_window(comp=competition)
 
-def scrape(parse_pdf=True):
-    LEVEL_PRESCRAPED    = model.Enum_Maintenance_Level.world_rowing_api_prescraped.value
-    LEVEL_SCRAPED       = model.Enum_Maintenance_Level.world_rowing_api_scraped.value
+        if scrape:
+            yield competition
 
-    with model.Scoped_Session() as session:
+
+def scrape(parse_pdf=True, workers=SCRAPER_WORKERS, pdf_processes=SCRAPER_PDF_PROCESSES):
+    """Competitions are fetched by a pool of worker threads, their PDFs are parsed by a pool of
+    processes (camelot is CPU bound). A single writer (the calling thread) owns the database
+    session and commits each competition as soon as its worker is done.
+    """
+    LEVEL_SCRAPED = model.Enum_Maintenance_Level.world_rowing_api_scraped.value
+
+    # "spawn": forking a process that already runs worker threads is not safe
+    pdf_executor = ProcessPoolExecutor(max_workers=pdf_processes, mp_context=multiprocessing.get_context("spawn"))
+
+    # ORM attributes must not be accessed from worker threads -> read them here
+    jobs_args = lambda competitions: (
+        (competition, competition.additional_id_, competition.scraper_fingerprints) for competition in competitions
+    )
+    fetch = lambda job_args: _fetch_competition(
+        job_args[1],
+        pdf_executor=pdf_executor,
+        parse_pdf_intermediates=parse_pdf,
+        parse_pdf_race_data=parse_pdf,
+        stored_fingerprints=job_args[2],
+    )
+
+    with model.Scoped_Session() as session, pdf_executor:
         competitions_iter, num_competitions = _get_competitions_to_scrape(session=session)
-        logger.info(f"Competitions that have to be scraped N={num_competitions}")
+        logger.info(f"Competitions that have to be scraped N={num_competitions} workers={workers} pdf_processes={pdf_processes}")
 
-        competition: model.Competition
-        for competition in tqdm(competitions_iter):
-            competition_uuid = competition.additional_id_
-            logger.info(f'Competition uuid="{competition_uuid}"')
-            try:
-                if not competition_uuid:
-                    logger.error(f"Competition with id={competition.id} has no UUID (w.r.t. World Rowing API); Skip")
-                    continue
-                
-                scrape = True
-                if competition.scraper_maintenance_level in [LEVEL_SCRAPED]:
-                    scrape = _competition_within_rescrape_window(comp=competition)
-
-                if scrape:
-                    # this also advances the maintenance_level
-                    _scrape_competition(
-                        session=session,
-                        competition=competition,
-                        parse_pdf_intermediates=parse_pdf,
-                        parse_pdf_race_data=parse_pdf,
-                    )
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scrape") as executor:
+            jobs_iter = jobs_args(_competitions_due(competitions_iter))
+            jobs = _submit_bounded(executor, fetch, jobs_iter, max_pending=2*workers)
+
+            competition: model.Competition
+            for (competition, competition_uuid, _), future in jobs:
+                try:
+                    fetched = future.result()
+
+                    changed = _write_competition(session=session, competition=competition, fetched=fetched)
 
                     # mark competition as SCRAPED along with date for rescrape logic
-                    competition.scraper_maintenance_level = LEVEL_SCRAPED
+                    # (an unchanged competition keeps its level)
+                    if changed:
+                        competition.scraper_maintenance_level = LEVEL_SCRAPED
                     competition.scraper_last_scrape = datetime.datetime.now()
 
-                session.commit()
-            except Exception as error:
-                logger.error(f'ERROR while scraping Competition uuid="{competition_uuid}"')
-                logger.error(str(error))
-                if SCRAPER_DEV_MODE:
-                    raise error
\ No newline at end of file
+                    session.commit()
+                except Exception as error:
+                    logger.error(f'ERROR while scraping Competition uuid="{competition_uuid}"')
+                    logger.error(str(error))
+                    session.rollback()
+                    if SCRAPER_DEV_MODE:
+                        raise error
@@ -366,6 +366,18 @@ def get_statistics(kwargs: dict = {}):
     return ret_val
 
 
+WR_FILTER_WBT = ut_wr.build_filter_string(filter_params={'category': 'WBT'})
+
+
+def map_world_best_time(val: dict) -> dict:
+    """Extracts the relevant fields of a single entry in the 'BestTimes' of a WBT statistic"""
+    return {
+        'race_boat_id': val['Competitor']['Id'],
+        'boat_class': val['BoatClass'],
+        'result_time': val['Competitor']['ResultTime']
+    }
+
+
 def get_world_best_times() -> list[dict]:
     """
         Use the endpoints '/stats', get the filtered world-best-times and get the urls to the jsons.
@@ -373,18 +385,13 @@ def get_world_best_times() -> list[dict]:
 
         TODO: Only return the boat-class and the competitor (race_boat_id)
     """
-    fs = ut_wr.build_filter_string(filter_params={'category': 'WBT'})
-    wbts = ut_wr.load_json(WR_BASE_URL + WR_ENDPOINT_STATS + fs)
+    wbts = ut_wr.load_json(WR_BASE_URL + WR_ENDPOINT_STATS + WR_FILTER_WBT)
     ret = []
     for wbt in wbts:
         if 'Overall' in wbt['description']:
             _wbts = ut_wr.load_json(wbt['url'], content_field='BestTimes')
             for val in _wbts:
-                ret.append({
-                    'race_boat_id': val['Competitor']['Id'],
-                    'boat_class': val['BoatClass'],
-                    'result_time': val['Competitor']['ResultTime']
-                })
+                ret.append(map_world_best_time(val))
                 #athletes = "; ".join([v['Person']['FullName'] for v in val['Competitor']['Athletes']])
                 # todo: remove me, once the data structure has been integrated
                 # the code below represents the needed information
@@ -0,0 +1,123 @@
+"""
+####################################################################################################
+Asynchronous client for the World Rowing API.
+
+Meant for phases that issue many independent requests (competition heads per year, world best
+times). Requests run concurrently, limited by a semaphore and a rate limiter. Retry semantics are
+the same as in utils_wr.load_json: failed requests are retried with exponential backoff, an HTTP
+error status is logged and yields an empty result.
+
+Usage from synchronous code:
+    heads_by_year = api_async.run(api_async.get_competition_heads, [2021, 2022])
+####################################################################################################
+"""
+
+import os
+import time
+import asyncio
+import json as jsn
+
+import aiohttp
+from tenacity import retry, wait_exponential, stop_after_attempt
+
+from . import utils_wr as ut_wr
+from .api import WR_BASE_URL, WR_ENDPOINT_COMPETITION, WR_ENDPOINT_STATS, WR_FILTER_WBT, map_world_best_time
+
+import logging
+logger = logging.getLogger(__name__)
+
+# max. number of requests in flight
+WR_ASYNC_CONCURRENCY = max(1, int(os.environ.get('WR_ASYNC_CONCURRENCY', '8').strip()))
+
+# max. number of requests started per second (0 -> unlimited)
+WR_ASYNC_MAX_RATE = float(os.environ.get('WR_ASYNC_MAX_RATE', '10').strip())
+
+
+class Rate_Limiter:
+    """Spaces out the start of requests so that at most max_rate requests are started per second"""
+    def __init__(self, max_rate: float):
+        self.interval = 1. / max_rate if max_rate > 0 else 0.
+        self._next_slot = 0.
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        # no await between read and update of _next_slot -> atomic within the event loop
+        now = time.monotonic()
+        delay = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class Async_Client:
+    """
+    Holds the aiohttp session (keep-alive connection pool) and the limits of all requests.
+    Has to be used as async context manager.
+    """
+    def __init__(self, concurrency=WR_ASYNC_CONCURRENCY, max_rate=WR_ASYNC_MAX_RATE, timeout=20.):
+        self.concurrency = concurrency
+        self.rate_limiter = Rate_Limiter(max_rate)
+        self.timeout = timeout
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    @retry(wait=wait_exponential(max=5), stop=stop_after_attempt(5))
+    async def load_json(self, url: str, content_field='data'):
+        """
+        Async counterpart of utils_wr.load_json.
+        The request will be retried, if the endpoint might not be reachable atm.
+        """
+        async with self._semaphore:
+            await self.rate_limiter.wait()
+            async with self._session.get(url) as res:
+                if res.status >= 400:
+                    logger.error(f"Error appeared during get(). \n\tStatuscode: {res.status}\n\tURL: {url}")
+                    return {}
+                content = await res.read()
+
+        if not content:
+            return {}
+        return jsn.loads(content)[content_field]
+
+
+def run(coroutine_function, *args, **client_kwargs):
+    """Runs coroutine_function(client, *args) in a new event loop and returns its result"""
+    async def main():
+        async with Async_Client(**client_kwargs) as client:
+            return await coroutine_function(client, *args)
+    return asyncio.run(main())
+
+
+async def get_competition_heads(client: Async_Client, years: list[int]) -> dict[int, list[dict]]:
+    """Fetches the competition heads of all years concurrently. Returns dict: year -> competition heads"""
+    urls = [
+        WR_BASE_URL + WR_ENDPOINT_COMPETITION + ut_wr.build_filter_string({'year': [year]})
+        for year in years
+    ]
+    results = await asyncio.gather(*[client.load_json(url) for url in urls])
+    return { year: competitions for year, competitions in zip(years, results) }
+
+
+async def get_world_best_times(client: Async_Client) -> list[dict]:
+    """Async counterpart of api.get_world_best_times. Fetches the 'Overall' statistics concurrently."""
+    wbts = await client.load_json(WR_BASE_URL + WR_ENDPOINT_STATS + WR_FILTER_WBT)
+    urls = [ wbt['url'] for wbt in wbts if 'Overall' in wbt['description'] ]
+    results = await asyncio.gather(*[client.load_json(url, content_field='BestTimes') for url in urls])
+
+    ret = []
+    for best_times in results:
+        for val in best_times:
+            ret.append(map_world_best_time(val))
+    return ret
@@ -0,0 +1,292 @@
+"""
+####################################################################################################
+Persistent on-disk cache for the result and race data pdf files of World Rowing.
+
+Layout of the cache directory:
+* blobs/<sha256>.pdf    file content, addressed by its content hash
+* urls/<sha256 of url>.json    index entry: url, ETag, Last-Modified and content hash
+
+* parsed/<parser>-v<version>/<sha256>.pickle    memoized parser output for a blob
+* size.json    running total of the cache size in bytes (guarded by a file lock)
+
+Cached files are revalidated with conditional GET requests (If-None-Match / If-Modified-Since),
+so an unchanged pdf is downloaded only once. The total size of the cache directory is capped: stores
+add their size to a running total, only when it exceeds PDF_CACHE_MAX_BYTES the directory is scanned
+and the least recently used pdfs are evicted (together with their parser output and url entries)
+down to PDF_CACHE_LOW_WATER_RATIO of the cap. Every scan resynchronizes the running total.
+Safe to be used by several threads and processes.
+
+Parser output is memoized by content hash and parser version. Bumping the PARSER_VERSION of a
+parser module makes all of its old entries unreachable; they are removed on the next store.
+####################################################################################################
+"""
+
+import os
+import json
+import fcntl
+import pickle
+import shutil
+import hashlib
+import tempfile
+from contextlib import suppress, contextmanager
+
+import requests
+
+from .utils_wr import get_http_session
+
+import logging
+logger = logging.getLogger(__name__)
+
+# constants
+PDF_CACHE_DIR = os.environ.get('SCRAPER_PDF_CACHE_DIR', '').strip() or os.path.join(tempfile.gettempdir(), 'drv_pdf_cache')
+PDF_CACHE_MAX_BYTES = int(os.environ.get('SCRAPER_PDF_CACHE_MAX_MB', '2048').strip()) * 1024 * 1024
+# an eviction frees space down to this share of PDF_CACHE_MAX_BYTES (no eviction scan on every store)
+PDF_CACHE_LOW_WATER_RATIO = 0.9
+PDF_REQUEST_TIMEOUT = 20.
+
+
+def _blobs_dir() -> str:
+    return os.path.join(PDF_CACHE_DIR, 'blobs')
+
+
+def _urls_dir() -> str:
+    return os.path.join(PDF_CACHE_DIR, 'urls')
+
+
+def _blob_path(content_hash: str) -> str:
+    return os.path.join(_blobs_dir(), f'{content_hash}.pdf')
+
+
+def _parsed_dir(parser: str, version: int) -> str:
+    return os.path.join(PDF_CACHE_DIR, 'parsed', f'{parser}-v{version}')
+
+
+def _entry_path(url: str) -> str:
+    url_hash = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(_urls_dir(), f'{url_hash}.json')
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    """Writes to a temporary file first, so that concurrent readers never see partial files"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_entry(url: str) -> dict:
+    """Returns the index entry of url if its blob is still cached, else None"""
+    try:
+        with open(_entry_path(url), 'r', encoding='utf-8') as fp:
+            entry = json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+    if entry.get('url') != url or not os.path.isfile(_blob_path(entry.get('sha256', ''))):
+        return None
+    return entry
+
+
+def _touch(path: str) -> None:
+    """mtime of a blob marks its last usage (LRU)"""
+    with suppress(OSError):
+        os.utime(path, None)
+
+
+def _scan(directory: str, suffix: str):
+    """Yields (content hash or name without suffix, path, stat) of the files in directory"""
+    with suppress(OSError):
+        with os.scandir(directory) as iterator:
+            for dir_entry in iterator:
+                if not dir_entry.name.endswith(suffix):
+                    continue
+                with suppress(OSError):
+                    yield dir_entry.name[:-len(suffix)], dir_entry.path, dir_entry.stat()
+
+
+def _evict(keep: str, max_bytes: int) -> int:
+    """Evicts least recently used pdfs until the cache fits into max_bytes. Counts blobs, memoized
+    parser output and url entries. A blob is evicted together with its parser output and the url
+    entries pointing to it; url entries and parser output without blob go first.
+    Never evicts the content hash keep. Returns the remaining size of the cache."""
+    # content hash -> {'blob': bool, 'used': last usage, 'size': bytes, 'paths': files}
+    groups = {}
+    def add(content_hash, path, stat, is_blob=False):
+        group = groups.setdefault(content_hash, {'blob': False, 'used': 0., 'size': 0, 'paths': []})
+        group['blob'] = group['blob'] or is_blob
+        group['used'] = max(group['used'], stat.st_mtime)
+        group['size'] += stat.st_size
+        group['paths'].append(path)
+
+    for content_hash, path, stat in _scan(_blobs_dir(), '.pdf'):
+        add(content_hash, path, stat, is_blob=True)
+
+    parsed_root = os.path.join(PDF_CACHE_DIR, 'parsed')
+    with suppress(OSError):
+        for name in os.listdir(parsed_root):
+            for content_hash, path, stat in _scan(os.path.join(parsed_root, name), '.pickle'):
+                add(content_hash, path, stat)
+
+    for _, path, stat in _scan(_urls_dir(), '.json'):
+        try:
+            with open(path, 'r', encoding='utf-8') as fp:
+                content_hash = json.load(fp).get('sha256', '')
+        except (OSError, ValueError):
+            content_hash = ''
+        add(content_hash, path, stat)
+
+    total_size = sum(group['size'] for group in groups.values())
+    # orphans first, then least recently used
+    candidates = sorted(
+        (group['blob'], group['used'], content_hash)
+        for content_hash, group in groups.items() if content_hash != keep
+    )
+    for has_blob, _, content_hash in candidates:
+        if has_blob and total_size <= max_bytes:
+            break
+        for path in groups[content_hash]['paths']:
+            with suppress(OSError):
+                os.remove(path)
+        logger.debug(f'Evicted pdf from cache "{content_hash}"')
+        total_size -= groups[content_hash]['size']
+    return total_size
+
+
+@contextmanager
+def _locked_size():
+    """Exclusive access (threads and processes) to the running total size of the cache.
+    Yields a dict whose 'bytes' is None if the total is unknown (first use, unreadable file)."""
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    fd = os.open(os.path.join(PDF_CACHE_DIR, 'size.json'), os.O_RDWR | os.O_CREAT)
+    with os.fdopen(fd, 'r+', encoding='utf-8') as fp:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        try:
+            size = {'bytes': int(json.loads(fp.read())['bytes'])}
+        except (ValueError, KeyError, TypeError):
+            size = {'bytes': None}
+        yield size
+        fp.seek(0)
+        fp.truncate()
+        fp.write(json.dumps(size))
+
+
+def _account_store(stored_bytes: int, keep: str) -> None:
+    """Adds a store to the running total. Scans and evicts only once the total exceeds PDF_CACHE_MAX_BYTES."""
+    with _locked_size() as size:
+        if size['bytes'] == None:
+            # the scan already counts the file just stored
+            size['bytes'] = _evict(keep, PDF_CACHE_MAX_BYTES)
+        else:
+            size['bytes'] += stored_bytes
+        if size['bytes'] > PDF_CACHE_MAX_BYTES:
+            size['bytes'] = _evict(keep, int(PDF_CACHE_MAX_BYTES * PDF_CACHE_LOW_WATER_RATIO))
+
+
+def fetch_pdf(url: str) -> tuple[str, str]:
+    """
+    Returns local path of the pdf file behind url, downloading it only if necessary.
+    -----------------------
+    Parameters:
+    * url:      url of the pdf file
+    -----------------------
+    Returns: tuple
+    * path to the cached file (to be passed to camelot)
+    * sha256 hash of the file content
+    """
+    entry = _read_entry(url)
+
+    headers = {}
+    if entry:
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        res = get_http_session().get(url, headers=headers, timeout=PDF_REQUEST_TIMEOUT)
+        if not (entry and res.status_code == 304):
+            res.raise_for_status()
+    except requests.RequestException as error:
+        if not entry:
+            raise
+        logger.warning(f'Revalidation failed, using cached pdf url="{url}": {error}')
+        res = None
+
+    if entry and (res == None or res.status_code == 304):
+        path = _blob_path(entry['sha256'])
+        _touch(path)
+        return path, entry['sha256']
+
+    content = res.content
+    content_hash = hashlib.sha256(content).hexdigest()
+    path = _blob_path(content_hash)
+    stored = not os.path.isfile(path)
+    if stored:
+        _write_atomic(path, content)
+    else:
+        _touch(path)
+
+    entry = {
+        'url': url,
+        'etag': res.headers.get('ETag'),
+        'last_modified': res.headers.get('Last-Modified'),
+        'sha256': content_hash,
+    }
+    entry = json.dumps(entry).encode('utf-8')
+    _write_atomic(_entry_path(url), entry)
+
+    # the cache only grows on stores, hits never touch the running total
+    if stored:
+        _account_store(len(content) + len(entry), keep=content_hash)
+    return path, content_hash
+
+
+__pruned_parsers = set()
+def _prune_stale_parser_versions(parser: str, version: int) -> None:
+    """Removes memoized results of all other versions of parser (once per process)"""
+    if (parser, version) in __pruned_parsers:
+        return
+    __pruned_parsers.add((parser, version))
+
+    current_dir = _parsed_dir(parser, version)
+    parent_dir = os.path.dirname(current_dir)
+    with suppress(OSError):
+        for name in os.listdir(parent_dir):
+            path = os.path.join(parent_dir, name)
+            if name.startswith(f'{parser}-v') and path != current_dir:
+                logger.info(f'Removing stale parser results "{path}"')
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def load_parsed(parser: str, version: int, content_hash: str):
+    """Returns memoized output of parser (in given version) for the pdf with content_hash.
+    Returns None if nothing was memoized yet."""
+    path = os.path.join(_parsed_dir(parser, version), f'{content_hash}.pickle')
+    try:
+        with open(path, 'rb') as fp:
+            return pickle.load(fp)
+    except FileNotFoundError:
+        return None
+    except Exception as error:
+        logger.warning(f'Could not load memoized parser results "{path}": {error}')
+        return None
+
+
+def store_parsed(parser: str, version: int, content_hash: str, data) -> None:
+    """Memoizes output of parser (in given version) for the pdf with content_hash"""
+    _prune_stale_parser_versions(parser, version)
+    path = os.path.join(_parsed_dir(parser, version), f'{content_hash}.pickle')
+    try:
+        data = pickle.dumps(data)
+        _write_atomic(path, data)
+    except OSError as error:
+        logger.warning(f'Could not memoize parser results "{path}": {error}')
+        return
+    _account_store(len(data), keep=content_hash)
@@ -18,6 +18,7 @@ import pandas as pd
 from typing import Union
 
 from .utils_general import write_to_json
+from . import pdf_cache
 from .utils_pdf import (handle_table_partitions, get_data_loc, print_stats, find_distance_column,
                        clean_df, get_string_loc, check_speed_stroke, reset_axis, clean_str)
 import logging
@@ -31,6 +32,9 @@ START_YEAR = 2010
 END_YEAR = 2022
 # special codes for the country line, which could affect the detection --> list contains values that are excluded
 SPECIAL_NAMES_FOR_COUNTRY_ROW = ["NPC", "NOC"]
+# bump whenever the extraction logic changes; invalidates memoized parser results (see pdf_cache)
+PARSER_NAME = "pdf_race_data"
+PARSER_VERSION = 1
 
 
 def read_race_data(df: pd.DataFrame) -> Union[dict, None]:
@@ -135,6 +139,7 @@ def exclude_empty_files(data: dict, limit: int = 5) -> list:
 def extract_data_from_pdf_url(urls: list) -> tuple[dict, list]:
     """
     Extracts data from given pdf urls using camelot-py
+    Parser results are memoized by pdf content (see pdf_cache), unchanged files are not parsed twice.
     -----------------------
     Parameters:
     * urls:     list containing all urls for pdf files
@@ -147,14 +152,19 @@ def extract_data_from_pdf_url(urls: list) -> tuple[dict, list]:
 
     for url in urls:
         try:
-            # read data via camelot
-            tables = camelot.read_pdf(url, flavor="stream", pages="all")
-            # handle data that is spread across multiple pages, linebreaks and empty columns
-            df = handle_table_partitions(tables=tables, results=False)
-            # extract relevant data and return dict
-            data_dict = read_race_data(df=df)
-            # exclude files that are below a specific limit of relevant data values
-            race_data_list = exclude_empty_files(data=data_dict, limit=5)
+            path, content_hash = pdf_cache.fetch_pdf(url)
+            race_data_list = pdf_cache.load_parsed(PARSER_NAME, PARSER_VERSION, content_hash)
+            if race_data_list == None:
+                # read data via camelot (from the local pdf cache)
+                tables = camelot.read_pdf(path, flavor="stream", pages="all")
+                # handle data that is spread across multiple pages, linebreaks and empty columns
+                df = handle_table_partitions(tables=tables, results=False)
+                # extract relevant data and return dict
+                data_dict = read_race_data(df=df)
+                # exclude files that are below a specific limit of relevant data values
+                # [] instead of None: a memoized None would read back as a cache miss
+                race_data_list = exclude_empty_files(data=data_dict, limit=5) or []
+                pdf_cache.store_parsed(PARSER_NAME, PARSER_VERSION, content_hash, race_data_list)
 
             if race_data_list:
                 final_data["url"] = url
@@ -18,6 +18,7 @@ from typing import Union
 import json
 
 from .utils_general import write_to_json
+from . import pdf_cache
 from .utils_pdf import (clean, clean_df, get_string_loc, handle_table_partitions,
                        clean_str, print_stats)
 import logging
@@ -32,6 +33,9 @@ COMPETITION_LIMIT = 1000
 START_YEAR = 2011
 END_YEAR = 2021
 EVERY_NTH_DOCUMENT = 25
+# bump whenever the extraction logic changes; invalidates memoized parser results (see pdf_cache)
+PARSER_NAME = "pdf_result"
+PARSER_VERSION = 1
 
 
 def get_athletes(df: pd.DataFrame, rows: list, i: int) -> list:
@@ -146,9 +150,45 @@ def check_extracted_data(data: dict) -> dict:
     return data
 
 
+def read_result_data(tables) -> list:
+    """
+    Extracts the data of all boats from the tables camelot found in a result pdf.
+    --------------
+    Returns: list with one dict per boat (empty if nothing was found)
+    """
+    data, boat_data = [], {}
+
+    # prepare df
+    df = clean(handle_table_partitions(tables=tables, results=True))
+    if not df.empty:
+        rank_row = get_string_loc(df, rank=True, column=0)["rank"]["row"]
+        # remove everything above the rank row
+        df = df.iloc[rank_row:].copy()
+        df = clean_df(df)
+        # get columns for intermediate times
+        dist_locs = get_string_loc(df, *DISTS)["str"]["col"]
+        # get country locations
+        cntry_locs = get_string_loc(df, country=True, results=True)["cntry"]
+        country_rows, _ = cntry_locs["row"], cntry_locs["col"]
+
+        for idx, row in enumerate(country_rows):
+            boat_data[idx] = {
+                "country": get_country_code(df=df, row=row),
+                "rank": idx + 1,
+                "lane": get_lane(df=df, row=row, i=idx),
+                "athletes": get_athletes(df=df, rows=country_rows, i=idx),
+                "times": get_times(df=df, row=row, cols=dist_locs),
+                "inter_ranks": get_intermediate_ranks(df=df, row=row)
+            }
+        data = [value for value in check_extracted_data(boat_data).values()]
+
+    return data
+
+
 def extract_data_from_pdf_urls(urls: list) -> tuple[dict, list]:
     """
     This function extracts relevant data from the result data pdfs.
+    Parser results are memoized by pdf content (see pdf_cache), unchanged files are not parsed twice.
     --------------
     Parameters:
     * urls: list of urls to pdfs
@@ -156,12 +196,15 @@ def extract_data_from_pdf_urls(urls: list) -> tuple[dict, list]:
     Returns: list with extracted data
     """
 
-    final_data, data, failed_requests, errors, empty_files = {}, [], [], 0, 0
+    final_data, failed_requests, errors, empty_files = {}, [], 0, 0
 
     for url in urls:
-        boat_data, tables = {}, []
+        data, tables, content_hash = None, [], None
         try:
-            tables = camelot.read_pdf(url, flavor="stream", pages="all", column_tol=2)
+            path, content_hash = pdf_cache.fetch_pdf(url)
+            data = pdf_cache.load_parsed(PARSER_NAME, PARSER_VERSION, content_hash)
+            if data == None:
+                tables = camelot.read_pdf(path, flavor="stream", pages="all", column_tol=2)
         except NotImplementedError:
             logger.error(f" PDF not accessible – ignore file...")
         except Exception as e:
@@ -169,47 +212,25 @@ def extract_data_from_pdf_urls(urls: list) -> tuple[dict, list]:
 
         if tables:
             try:
-                # prepare df
-                df = clean(handle_table_partitions(tables=tables, results=True))
-                if not df.empty:
-                    rank_row = get_string_loc(df, rank=True, column=0)["rank"]["row"]
-                    # remove everything above the rank row
-                    df = df.iloc[rank_row:].copy()
-                    df = clean_df(df)
-                    # get columns for intermediate times
-                    dist_locs = get_string_loc(df, *DISTS)["str"]["col"]
-                    # get country locations
-                    cntry_locs = get_string_loc(df, country=True, results=True)["cntry"]
-                    country_rows, _ = cntry_locs["row"], cntry_locs["col"]
-
-                    for idx, row in enumerate(country_rows):
-                        boat_data[idx] = {
-                            "country": get_country_code(df=df, row=row),
-                            "rank": idx + 1,
-                            "lane": get_lane(df=df, row=row, i=idx),
-                            "athletes": get_athletes(df=df, rows=country_rows, i=idx),
-                            "times": get_times(df=df, row=row, cols=dist_locs),
-                            "inter_ranks": get_intermediate_ranks(df=df, row=row)
-                        }
-                    data = [value for value in check_extracted_data(boat_data).values()]
-
-                elif df.empty:
-                    data = []
-
-                if data:
-                    final_data["url"] = url
-                    final_data["data"] = data
-
-                    logger.debug(f"Extract of {url.split('/').pop()} successful.")
-                else:
-                    empty_files += 1
-                    logger.warning(f"Empty file found: {url.split('/').pop()}.")
-
+                data = read_result_data(tables)
+                pdf_cache.store_parsed(PARSER_NAME, PARSER_VERSION, content_hash, data)
             except Exception as e:
                 errors += 1
                 failed_requests.append(url)
                 logger.exception(f"Error at {url}: {e}.")
 
+        if data == None:
+            continue
+
+        if data:
+            final_data["url"] = url
+            final_data["data"] = data
+
+            logger.debug(f"Extract of {url.split('/').pop()} successful.")
+        else:
+            empty_files += 1
+            logger.warning(f"Empty file found: {url.split('/').pop()}.")
+
     total = len(urls) - empty_files
     rate = "{:.2f}".format(100 - ((errors / total if total else 0) * 100))
     print_stats(total=total, errors=errors, empties=empty_files, rate=rate)
@@ -2,8 +2,12 @@ from tenacity import retry, wait_exponential, stop_after_attempt
 from datetime import datetime
 from typing import Union, Tuple
 
+import os
 import re
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
 import pandas as pd
 import numpy as np
 
@@ -24,6 +28,40 @@ WR_FILTER_MAPPING = {
 
 STR_NUMBERS_0_10 = ''.join([str(n) for n in range(0, 10)])
 
+# max. number of keep-alive connections per host
+WR_HTTP_POOL_SIZE = int(os.environ.get('WR_HTTP_POOL_SIZE', '16').strip())
+
+
+__http_session = None
+__http_session_lock = threading.Lock()
+
+def get_http_session() -> requests.Session:
+    """
+    Returns the HTTP session shared by all threads of this process.
+    Connections are pooled and kept alive, compressed responses are negotiated
+    (gzip/deflate; brotli if the brotli package is installed).
+    """
+    global __http_session
+    if __http_session == None:
+        with __http_session_lock:
+            if __http_session == None:
+                adapter = HTTPAdapter(pool_connections=WR_HTTP_POOL_SIZE, pool_maxsize=WR_HTTP_POOL_SIZE)
+                session = requests.Session()
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+                __http_session = session
+    return __http_session
+
+
+def _reset_http_session():
+    """Pooled connections must not be shared with forked child processes"""
+    global __http_session, __http_session_lock
+    __http_session = None
+    __http_session_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_http_session)
+
 
 def procedure_init():
     """
@@ -86,7 +124,7 @@ def load_json(url: str, content_field='data', params=None, timeout=20., **kwargs
     """
     res = None
     try:
-        res = requests.get(url, params=params, timeout=timeout, **kwargs)
+        res = get_http_session().get(url, params=params, timeout=timeout, **kwargs)
         res.raise_for_status()
     except (Exception, ) as e:
         logger.error(f"Error appeared during get(). \n\tStatuscode: {res.status_code}\n\tURL: {url}")
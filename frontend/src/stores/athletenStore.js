@@ -189,7 +189,7 @@ export const useAthletenState = defineStore({
         async postSearchAthlete(data) {
             await axios.post(`${import.meta.env.VITE_BACKEND_API_BASE_URL}/get_athlete_by_name/`, {data})
                 .then(response => {
-                    this.previewAthleteResults = response.data
+                    this.previewAthleteResults = response.data.results
                 }).catch(error => {
                     console.error(`Request failed: ${error}`)
                 })